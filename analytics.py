@@ -0,0 +1,212 @@
+'''
+Estimates each player's winnings from hand histories with the luck of all-in showdowns removed.
+
+Usage: python3 analytics.py HISTORY...
+
+Once both players are all-in with cards still to come, the realized showdown is replaced by the
+players' equities, estimated by dealing the rest of the board many times under River of Blood
+rules. Rounds are broken down by the street on which they were decided: the street of the fold,
+of the all-in, or of the showdown.
+'''
+from collections import namedtuple
+from multiprocessing import Pool
+import argparse
+import os
+import numpy as np
+import eval7
+
+from config import STARTING_STACK, BIG_BLIND, SMALL_BLIND
+from decks import CARDS, final_streets
+from histories import load_history
+
+NUM_SAMPLES = 2000  # runouts dealt per all-in
+STREET_LABELS = ('Preflop', 'Flop', 'Turn', 'River', 'Run')
+CARD_INDEX = {str(card): index for index, card in enumerate(CARDS)}
+
+# names: the players' names per round, small blind first
+# streets: the index into STREET_LABELS of the street each round was decided on
+# deltas: the small blind's realized winnings per round
+# expected: the small blind's winnings per round with all-in showdowns replaced by their equity
+# all_ins: True for the rounds whose showdown was replaced
+MatchRounds = namedtuple('MatchRounds', ['names', 'streets', 'deltas', 'expected', 'all_ins'])
+
+
+def street_label_index(street):
+    '''
+    Returns the index into STREET_LABELS of a street given as the number of board cards.
+    '''
+    return 0 if street == 0 else min(street - 2, len(STREET_LABELS) - 1)
+
+
+def all_in_board(recorded_round):
+    '''
+    Returns the board cards known when both players went all-in before the final street,
+    or None if they did not.
+    '''
+    committed = [0, 0]
+    pips = [SMALL_BLIND, BIG_BLIND]
+    board = []
+    shown = any(event[0] == 'show' for event in recorded_round.events)
+    for event in recorded_round.events:
+        kind = event[0]
+        if kind == 'board':
+            committed = [committed[0] + pips[0], committed[1] + pips[1]]
+            pips = [0, 0]
+            if shown and committed == [STARTING_STACK, STARTING_STACK]:
+                return board
+            board = event[2]
+        elif kind == 'action':
+            seat, code = event[1], event[2]
+            if code == 'C':
+                pips[seat] = pips[1-seat]
+            elif code.startswith('R'):
+                pips[seat] = int(code[1:])
+    return None
+
+
+def runout_equity(hands, board, rng, num_samples=NUM_SAMPLES):
+    '''
+    Estimates the small blind's share of the pot by dealing the rest of the board num_samples times.
+
+    Arguments:
+    hands: the players' hole cards as card indices, small blind first.
+    board: the board cards dealt so far as card indices.
+    rng: a numpy random Generator.
+    '''
+    known = list(hands[0]) + list(hands[1]) + list(board)
+    rest = np.setdiff1d(np.arange(len(CARDS)), known)
+    decks = np.empty((num_samples, len(CARDS)), dtype=np.int64)
+    decks[:, :len(known)] = known
+    decks[:, len(known):] = rng.permuted(np.tile(rest, (num_samples, 1)), axis=1)
+    streets = final_streets(decks)
+    cards = [[CARDS[index] for index in hand] for hand in hands]
+    share = 0
+    for deck, street in zip(decks[:, 4:].tolist(), streets.tolist()):
+        runout = [CARDS[index] for index in deck[:street]]
+        score0 = eval7.evaluate(runout + cards[0])
+        score1 = eval7.evaluate(runout + cards[1])
+        share += 2 if score0 > score1 else 1 if score0 == score1 else 0
+    return share / (2 * num_samples)
+
+
+def analyze_match(filename, rng, num_samples=NUM_SAMPLES):
+    '''
+    Reads one match and computes the realized and all-in adjusted winnings of its rounds.
+    '''
+    rounds = load_history(filename)
+    streets = np.zeros(len(rounds), dtype=np.int64)
+    deltas = np.zeros(len(rounds))
+    expected = np.zeros(len(rounds))
+    all_ins = np.zeros(len(rounds), dtype=bool)
+    for i, recorded_round in enumerate(rounds):
+        street = 0
+        for event in recorded_round.events:
+            if event[0] == 'board':
+                street = event[1]
+            elif event[0] == 'award' and event[1] == 0:
+                deltas[i] = event[2]
+        expected[i] = deltas[i]
+        board = all_in_board(recorded_round)
+        if board is not None:
+            hands = [[CARD_INDEX[card] for card in hand] for hand in recorded_round.hands]
+            equity = runout_equity(hands, [CARD_INDEX[card] for card in board], rng, num_samples)
+            expected[i] = STARTING_STACK * (2 * equity - 1)
+            all_ins[i] = True
+            street = len(board)
+        streets[i] = street_label_index(street)
+    names = [tuple(recorded_round.names) for recorded_round in rounds]
+    return MatchRounds(names, streets, deltas, expected, all_ins)
+
+
+# each worker process seeds its runouts from the match's position on the command line
+_worker = {}
+
+
+def _init_worker(seed, num_samples):
+    _worker['seed'] = seed
+    _worker['num_samples'] = num_samples
+
+
+def _analyze_worker(task):
+    index, filename = task
+    seed = _worker['seed']
+    rng = np.random.default_rng(None if seed is None else [seed, index])
+    return analyze_match(filename, rng, _worker['num_samples'])
+
+
+def analyze_matches(filenames, seed=None, num_samples=NUM_SAMPLES, processes=None):
+    '''
+    Analyzes recorded matches across a process pool and concatenates their rounds.
+
+    Returns:
+    A MatchRounds holding every round, in the order the matches were given.
+    '''
+    initargs = (seed, num_samples)
+    with Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        matches = pool.map(_analyze_worker, list(enumerate(os.path.abspath(name) for name in filenames)))
+    return MatchRounds([names for match in matches for names in match.names],
+                       *(np.concatenate([getattr(match, field) for match in matches])
+                         for field in MatchRounds._fields[1:]))
+
+
+def confidence_interval(values):
+    '''
+    Returns the mean of per-round winnings in mbb/hand and the half-width of its 95% confidence interval.
+    '''
+    values = np.asarray(values) / BIG_BLIND * 1000
+    if len(values) < 2:
+        return (values.mean() if len(values) else 0.), float('inf')
+    return values.mean(), 1.96 * values.std(ddof=1) / np.sqrt(len(values))
+
+
+def player_summary(match_rounds, name):
+    '''
+    Computes one player's winnings overall and by street.
+
+    Returns:
+    A dict holding the number of rounds played and of all-ins, the realized and adjusted winnings
+    in mbb/hand as (mean, half-width) pairs, and per street the number of rounds decided on it
+    and their contribution to the realized and adjusted winnings in mbb/hand.
+    '''
+    seats = np.array([names.index(name) if name in names else -1 for names in match_rounds.names])
+    played = seats >= 0
+    sign = np.where(seats[played] == 0, 1., -1.)
+    deltas = sign * match_rounds.deltas[played]
+    expected = sign * match_rounds.expected[played]
+    streets = match_rounds.streets[played]
+    rounds = max(len(deltas), 1)
+    return {
+        'rounds': len(deltas),
+        'all_ins': int(match_rounds.all_ins[played].sum()),
+        'realized': confidence_interval(deltas),
+        'adjusted': confidence_interval(expected),
+        'streets': [(int((streets == street).sum()),
+                     deltas[streets == street].sum() / rounds / BIG_BLIND * 1000,
+                     expected[streets == street].sum() / rounds / BIG_BLIND * 1000)
+                    for street in range(len(STREET_LABELS))],
+    }
+
+
+def main():
+    '''
+    Prints the winnings of each player in the matches given on the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 analytics.py')
+    parser.add_argument('histories', type=str, nargs='+', help='Game logs or .json structured histories')
+    parser.add_argument('--samples', type=int, default=NUM_SAMPLES, help='Runouts dealt per all-in')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the CPU count')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    match_rounds = analyze_matches(args.histories, args.seed, args.samples, args.processes)
+    players = sorted(set(name for names in match_rounds.names for name in names))
+    for name in players:
+        summary = player_summary(match_rounds, name)
+        print('{}: {} rounds, {} all-in'.format(name, summary['rounds'], summary['all_ins']))
+        for label in ('realized', 'adjusted'):
+            print('  {:<10}{:>10.1f} +/- {:.1f} mbb/hand'.format(label, *summary[label]))
+        for label, (rounds, realized, adjusted) in zip(STREET_LABELS, summary['streets']):
+            print('  {:<10}{:>10.1f} {:>10.1f} mbb/hand over {} rounds'.format(label, realized, adjusted, rounds))
+
+
+if __name__ == '__main__':
+    main()
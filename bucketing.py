@@ -0,0 +1,297 @@
+'''
+Builds hand buckets per street for python_skeleton/skeleton/buckets.py.
+
+Usage: python3 bucketing.py OUTPUT_DIRECTORY
+
+Every (hand, board) situation on a tabulated street is described by the distribution of its equity
+against a random hand over sampled runouts, dealt to the River of Blood final street. Boards are
+reduced to one per class of suit relabellings that keep each suit's colour, since red cards extend
+the board and black cards end it. River boards are further split by the colour of the river card,
+which decides whether the board is complete. The distributions are clustered with mini-batch k-means
+on their cumulative histograms, whose Euclidean distance tracks the earth mover's distance between
+the histograms, and buckets are numbered from the weakest cluster to the strongest.
+
+Equity histograms are computed across a process pool and kept in a memory-mapped file in the output
+directory until they are clustered, so the tables for long streets do not have to fit in memory.
+'''
+from itertools import combinations
+from multiprocessing import Pool
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from decks import RED_SUITS, final_streets
+from hands import NUM_HANDS, Showdown, opponent_mass, rank_hands
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_skeleton'))
+from skeleton.buckets import SUIT_PERMUTATIONS, BINOMIAL, NUM_CARDS, MAX_TABLE_STREET, RIVER_STREET
+
+DEFAULT_STREETS = (0, 3, 4, 5)
+# runouts dealt per board
+DEFAULT_SAMPLES = {0: 1024, 3: 32, 4: 16, 5: 8}
+NUM_BUCKETS = 32
+NUM_BINS = 16
+BOARDS_PER_TASK = 16
+BATCH_SIZE = 16384  # situations per mini-batch k-means step
+NUM_ITERATIONS = 200
+
+
+def board_codes(boards):
+    '''
+    Returns the colexicographic ranks of an array of boards with one board per row, in ascending order.
+    '''
+    binomial = np.array(BINOMIAL, dtype=np.int64)
+    return binomial[boards, np.arange(1, boards.shape[1] + 1)].sum(axis=1)
+
+
+def canonical_boards(street):
+    '''
+    Reduces the boards of a street to one per class of colour-preserving suit relabellings.
+
+    Returns:
+    board_index: for every board, by colexicographic rank, its canonical board's row times
+    len(SUIT_PERMUTATIONS) plus the index of the suit permutation taking it there.
+    boards: the canonical boards, one per row, in ascending order of rank.
+    weights: the number of boards each canonical board stands for.
+    '''
+    raw = np.array(list(combinations(range(NUM_CARDS), street)), dtype=np.int64)
+    best = np.full(len(raw), np.iinfo(np.int64).max)
+    best_permutation = np.zeros(len(raw), dtype=np.int64)
+    for index, permutation in enumerate(SUIT_PERMUTATIONS):
+        mapped = np.sort(raw - raw % 4 + np.array(permutation)[raw % 4], axis=1)
+        codes = board_codes(mapped)
+        better = codes < best
+        best[better] = codes[better]
+        best_permutation[better] = index
+    codes = board_codes(raw)
+    canonical_codes, rows, weights = np.unique(best, return_inverse=True, return_counts=True)
+    board_index = np.zeros(len(raw), dtype=np.int32)
+    board_index[codes] = rows * len(SUIT_PERMUTATIONS) + best_permutation
+    # each canonical board is the member of its class ranked lowest
+    canonical = raw[codes == best]
+    boards = canonical[np.argsort(board_codes(canonical))]
+    assert np.array_equal(board_codes(boards), canonical_codes)
+    return board_index, boards, weights
+
+
+def river_boards(boards, weights):
+    '''
+    Splits each canonical river board into the rows of the river table, ordered as by river_row:
+    with a black card dealt last, then with a red card dealt last.
+
+    Returns:
+    The ordered boards, and the number of dealt boards each stands for, which is 0 for boards
+    holding no card of the river's colour.
+    '''
+    red = np.isin(boards % 4, RED_SUITS)
+    ordered = np.empty((2 * len(boards), boards.shape[1]), dtype=boards.dtype)
+    ordered_weights = np.empty(2 * len(boards))
+    rows = np.arange(len(boards))
+    for colour in (False, True):
+        matches = red == colour
+        last = matches.argmax(axis=1)
+        variant = boards.copy()
+        variant[rows, last] = boards[:, -1]
+        variant[:, -1] = boards[rows, last]
+        table_rows = 2 * rows + int(colour)  # as in river_row
+        ordered[table_rows] = variant
+        # each card of the colour is equally likely to be the river
+        ordered_weights[table_rows] = weights * matches.sum(axis=1) / boards.shape[1]
+    return ordered, ordered_weights
+
+
+def equity_histograms(board, num_samples, num_bins, rng):
+    '''
+    Computes each hand's distribution of equity against a random hand over runouts of a board,
+    given with its cards in the order they were dealt.
+
+    Returns:
+    An array holding for each hand its frequency per equity bin scaled to 255, all zero for
+    hands sharing a card with the board.
+    '''
+    board = np.asarray(board, dtype=np.int64)
+    if len(board) >= MAX_TABLE_STREET and board[-1] % 4 not in RED_SUITS:
+        num_samples = 1  # the board is complete
+    rest = np.setdiff1d(np.arange(NUM_CARDS), board)
+    runouts = np.concatenate((np.tile(board, (num_samples, 1)),
+                              rng.permuted(np.tile(rest, (num_samples, 1)), axis=1)), axis=1)
+    streets = final_streets(runouts, dealt=0).astype(np.int64)
+    ranks = np.array([rank_hands(runout[:street]) for runout, street in zip(runouts.tolist(), streets.tolist())])
+    # runouts holding one of a hand's cards are not counted for it
+    reach = (ranks >= 0).astype(float)
+    equities = 0.5 + 0.5 * Showdown(ranks).mass(reach) / np.maximum(opponent_mass(reach), 1.)
+    bins = np.minimum((equities * num_bins).astype(np.int64), num_bins - 1)
+    # runouts are dealt from the cards the board leaves rather than those a hand leaves, which makes
+    # a runout of final street L less likely by a factor of (52 - L) * (51 - L); as in exploitability.py,
+    # weighting by its inverse keeps longer boards from being undercounted
+    weights = 1. / ((NUM_CARDS - streets) * (NUM_CARDS - 1 - streets))
+    counts = np.zeros((NUM_HANDS, num_bins))
+    np.add.at(counts, (np.broadcast_to(np.arange(NUM_HANDS), bins.shape), bins), reach * weights[:, None])
+    totals = counts.sum(axis=1, keepdims=True)
+    frequencies = counts / np.where(totals > 0, totals, 1.)
+    return np.rint(frequencies * 255).astype(np.uint8)
+
+
+# each worker process computes the histograms of a range of canonical boards
+_worker = {}
+
+
+def _init_worker(boards, weights, num_samples, num_bins, seed):
+    _worker['boards'] = boards
+    _worker['weights'] = weights
+    _worker['num_samples'] = num_samples
+    _worker['num_bins'] = num_bins
+    _worker['seed'] = seed
+
+
+def _histogram_worker(task):
+    start, stop = task
+    seed = _worker['seed']
+    rng = np.random.default_rng(None if seed is None else [seed, len(_worker['boards'][0]), start])
+    histograms = np.zeros((stop - start, NUM_HANDS, _worker['num_bins']), dtype=np.uint8)
+    for i in range(start, stop):
+        if _worker['weights'][i] > 0:  # river boards can lack a card of the river's colour
+            histograms[i - start] = equity_histograms(_worker['boards'][i], _worker['num_samples'],
+                                                      _worker['num_bins'], rng)
+    return start, histograms
+
+
+def cumulative_histograms(features):
+    '''
+    Converts histograms scaled to 255 into cumulative distributions.
+    '''
+    histograms = features.astype(np.float32)
+    histograms /= np.maximum(histograms.sum(axis=-1, keepdims=True), 1.)
+    return np.cumsum(histograms, axis=-1)
+
+
+def nearest_centers(points, centers):
+    '''
+    Returns the index of the center closest to each point.
+    '''
+    distances = (centers * centers).sum(axis=1) - 2 * points @ centers.T
+    return distances.argmin(axis=1)
+
+
+def sample_situations(features, weights, size, rng):
+    '''
+    Draws (board, hand) situations in proportion to how often they are dealt,
+    returning their cumulative histograms.
+    '''
+    rows = rng.choice(len(weights), size=size, p=weights / weights.sum())
+    points = cumulative_histograms(features[np.sort(rows), rng.integers(NUM_HANDS, size=size)])
+    # hands sharing a card with their board have empty histograms
+    return points[points[:, -1] > 0]
+
+
+def cluster(features, weights, num_buckets, rng, batch_size=BATCH_SIZE, iterations=NUM_ITERATIONS):
+    '''
+    Clusters equity histograms with mini-batch k-means on their cumulative histograms.
+
+    Arguments:
+    features: an array of histograms with one row per canonical board and one column per hand.
+    weights: the number of boards each row stands for.
+
+    Returns:
+    The cluster centers, ordered from the lowest mean equity to the highest.
+    '''
+    # k-means++ seeding on a sample
+    points = sample_situations(features, weights, max(batch_size, 8 * num_buckets), rng)
+    centers = [points[rng.integers(len(points))]]
+    distances = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, num_buckets):
+        total = distances.sum()
+        center = points[rng.choice(len(points), p=distances / total)] if total > 0 else points[rng.integers(len(points))]
+        centers.append(center)
+        distances = np.minimum(distances, ((points - center) ** 2).sum(axis=1))
+    centers = np.array(centers)
+    counts = np.zeros(num_buckets)
+    for _ in range(iterations):
+        points = sample_situations(features, weights, batch_size, rng)
+        nearest = nearest_centers(points, centers)
+        batch_counts = np.bincount(nearest, minlength=num_buckets)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, nearest, points)
+        counts += batch_counts
+        moved = batch_counts > 0
+        # each center moves towards its points' mean with a step shrinking as it absorbs more points
+        rate = (batch_counts[moved] / counts[moved])[:, None]
+        centers[moved] += rate * (sums[moved] / batch_counts[moved, None] - centers[moved])
+    # a lower cumulative histogram means a higher equity
+    return centers[np.argsort(-centers.sum(axis=1))]
+
+
+def build_street(directory, street, num_samples, num_buckets, num_bins, seed, processes):
+    '''
+    Computes, clusters and writes the buckets of one street.
+    '''
+    board_index, boards, weights = canonical_boards(street)
+    np.save(os.path.join(directory, 'board-index-{}.npy'.format(street)), board_index)
+    weights = weights.astype(float)
+    if street == RIVER_STREET:
+        boards, weights = river_boards(boards, weights)
+    features_filename = os.path.join(directory, 'features-{}.npy'.format(street))
+    features = np.lib.format.open_memmap(features_filename, mode='w+', dtype=np.uint8,
+                                         shape=(len(boards), NUM_HANDS, num_bins))
+    tasks = [(start, min(start + BOARDS_PER_TASK, len(boards))) for start in range(0, len(boards), BOARDS_PER_TASK)]
+    initargs = (boards, weights, num_samples, num_bins, seed)
+    with Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        for start, histograms in pool.imap_unordered(_histogram_worker, tasks):
+            features[start:start + len(histograms)] = histograms
+    features.flush()
+    rng = np.random.default_rng(None if seed is None else [seed, street])
+    centers = cluster(features, weights, num_buckets, rng)
+    buckets = np.lib.format.open_memmap(os.path.join(directory, 'buckets-{}.npy'.format(street)), mode='w+',
+                                        dtype=np.uint8, shape=(len(boards), NUM_HANDS))
+    rows_per_chunk = max(1, BATCH_SIZE // NUM_HANDS)
+    for start in range(0, len(boards), rows_per_chunk):
+        points = cumulative_histograms(features[start:start + rows_per_chunk]).reshape(-1, num_bins)
+        buckets[start:start + rows_per_chunk] = nearest_centers(points, centers).reshape(-1, NUM_HANDS)
+    buckets.flush()
+    del features
+    os.remove(features_filename)
+    return len(boards)
+
+
+def main():
+    '''
+    Builds the bucket tables for the streets given on the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 bucketing.py')
+    parser.add_argument('directory', type=str, help='Directory to write the tables to')
+    parser.add_argument('--streets', type=str, default=','.join(str(street) for street in DEFAULT_STREETS),
+                        help='Streets to tabulate, from 0, 3, 4 and 5')
+    parser.add_argument('--samples', type=int, default=None, help='Runouts per board, defaults per street')
+    parser.add_argument('--buckets', type=int, default=NUM_BUCKETS, help='Buckets per street, at most 256')
+    parser.add_argument('--bins', type=int, default=NUM_BINS, help='Equity histogram bins')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the CPU count')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    streets = sorted(int(street) for street in args.streets.split(','))
+    if any(street not in DEFAULT_SAMPLES for street in streets):
+        parser.error('streets must be among ' + ', '.join(str(street) for street in DEFAULT_SAMPLES))
+    if not 0 < args.buckets <= 256:
+        parser.error('between 1 and 256 buckets are supported')
+    os.makedirs(args.directory, exist_ok=True)
+    for street in streets:
+        start_time = time.perf_counter()
+        num_samples = DEFAULT_SAMPLES[street] if args.samples is None else args.samples
+        num_boards = build_street(args.directory, street, num_samples, args.buckets, args.bins,
+                                  args.seed, args.processes)
+        print('Street {}: {} boards ({:.1f}s)'.format(street, num_boards, time.perf_counter() - start_time))
+    metadata = {
+        'streets': streets,
+        'num_buckets': {street: args.buckets for street in streets},
+        'run_buckets': args.buckets,
+        'bins': args.bins,
+        'suit_permutations': len(SUIT_PERMUTATIONS),
+    }
+    with open(os.path.join(args.directory, 'buckets.json'), 'w') as metadata_file:
+        json.dump(metadata, metadata_file)
+
+
+if __name__ == '__main__':
+    main()
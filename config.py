@@ -7,6 +7,8 @@ PLAYER_2_NAME = 'B'
 PLAYER_2_PATH = './python_skeleton'
 # GAME PROGRESS IS RECORDED HERE
 GAME_LOG_FILENAME = 'gamelog'
+# GAMES AFTER THE FIRST REUSE THE CONNECTED POKERBOTS WHEN THEY SUPPORT NEW GAMES
+NUM_GAMES = 1
 # PLAYER_LOG_SIZE_LIMIT IS IN BYTES
 PLAYER_LOG_SIZE_LIMIT = 524288
 # STARTING_GAME_CLOCK AND TIMEOUTS ARE IN SECONDS
@@ -14,6 +16,11 @@ ENFORCE_GAME_CLOCK = True
 STARTING_GAME_CLOCK = 30.
 BUILD_TIMEOUT = 10.
 CONNECT_TIMEOUT = 10.
+# SET DECK_SEED TO AN INTEGER FOR REPRODUCIBLE DEALS
+DECK_SEED = None
+# IF SET, DECKS ARE REPLAYED FROM THIS FILE, WHICH IS WRITTEN FIRST IF MISSING
+# WITH NUM_GAMES ABOVE 1, EACH GAME HAS ITS OWN FILE, NUMBERED LIKE ITS LOGS
+DECK_STREAM_FILENAME = None
 # THE GAME VARIANT FIXES THE PARAMETERS BELOW
 # CHANGE ONLY FOR TRAINING OR EXPERIMENTATION
 NUM_ROUNDS = 1000
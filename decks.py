@@ -0,0 +1,127 @@
+'''
+Seeded, batch-pregenerated deck streams for the game engine.
+'''
+import numpy as np
+import eval7
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+# card index = 4 * rank + suit, matching the order of eval7.Deck().cards
+CARDS = [eval7.Card(rank + suit) for rank in RANKS for suit in SUITS]
+RED_SUITS = (1, 2)  # eval7 card suits are defined as ('c', 'd', 'h', 's')
+MAX_FINAL_STREET = 48
+DECK_BATCH_SIZE = 4096
+
+
+def final_streets(decks, dealt=4):
+    '''
+    Computes the River of Blood final street of each deck in a batch.
+
+    Arguments:
+    decks: an array of card indices with one deck per row.
+    dealt: the number of cards dealt to the players before the board.
+
+    Returns:
+    An array holding the final street of each deck.
+    '''
+    suits = decks[:, dealt:] % 4
+    black = (suits != RED_SUITS[0]) & (suits != RED_SUITS[1])
+    # cards keep being dealt past the river until a black card shows up
+    black[:, :4] = False
+    streets = np.where(black.any(axis=1), black.argmax(axis=1) + 1, MAX_FINAL_STREET)
+    return np.minimum(streets, MAX_FINAL_STREET).astype(np.uint8)
+
+
+class Deck():
+    '''
+    A pre-shuffled deck with the dealing interface of eval7.Deck.
+    '''
+
+    def __init__(self, cards):
+        self.cards = cards
+
+    def deal(self, n):
+        '''
+        Removes and returns the top n cards.
+        '''
+        cards = self.cards[:n]
+        del self.cards[:n]
+        return cards
+
+    def peek(self, n):
+        '''
+        Returns the top n cards without removing them.
+        '''
+        return self.cards[:n]
+
+
+class DeckStream():
+    '''
+    Deals shuffled decks from a seeded random number generator, shuffling them in batches.
+    '''
+
+    def __init__(self, seed=None, batch_size=DECK_BATCH_SIZE):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.decks = np.empty((0, len(CARDS)), dtype=np.uint8)
+        self.final_streets = np.empty(0, dtype=np.uint8)
+        self.position = 0
+        self.replay = False
+
+    def shuffle(self, num_decks):
+        '''
+        Shuffles a batch of decks and precomputes their final streets.
+        '''
+        decks = np.tile(np.arange(len(CARDS), dtype=np.uint8), (num_decks, 1))
+        decks = self.rng.permuted(decks, axis=1)
+        return decks, final_streets(decks)
+
+    def pregenerate(self, num_decks):
+        '''
+        Ensures that at least num_decks decks are waiting to be dealt.
+        '''
+        remaining = len(self.decks) - self.position
+        if remaining >= num_decks:
+            return
+        if self.replay:
+            raise ValueError('deck stream holds only {} more decks'.format(remaining))
+        decks, streets = self.shuffle(max(num_decks - remaining, self.batch_size))
+        self.decks = np.concatenate((self.decks[self.position:], decks))
+        self.final_streets = np.concatenate((self.final_streets[self.position:], streets))
+        self.position = 0
+
+    def deal(self):
+        '''
+        Returns the next deck and its final street.
+        '''
+        if self.position == len(self.decks):
+            self.pregenerate(1)  # raises if a loaded stream is exhausted
+        cards = [CARDS[index] for index in self.decks[self.position].tolist()]
+        final_street = int(self.final_streets[self.position])
+        self.position += 1
+        return Deck(cards), final_street
+
+    def save(self, filename, num_decks):
+        '''
+        Writes the next num_decks decks to a file without dealing them.
+        '''
+        self.pregenerate(num_decks)
+        end = self.position + num_decks
+        with open(filename, 'wb') as stream_file:
+            np.savez(stream_file, decks=self.decks[self.position:end],
+                     final_streets=self.final_streets[self.position:end])
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Reads a deck stream written by save. The decks are dealt in order, and dealing past the last one raises.
+        '''
+        stream = cls()
+        with np.load(filename) as stream_file:
+            stream.decks = stream_file['decks']
+            stream.final_streets = stream_file['final_streets']
+        if len(stream.decks) == 0:
+            raise ValueError(filename + ' holds no decks')
+        stream.replay = True
+        return stream
@@ -4,9 +4,10 @@ DO NOT REMOVE, RENAME, OR EDIT THIS FILE
 '''
 from collections import namedtuple
 from threading import Thread
-from queue import Queue
+from queue import Queue, Empty
 import time
 import json
+import signal
 import subprocess
 import socket
 import eval7
@@ -15,6 +16,7 @@ import os
 
 sys.path.append(os.getcwd())
 from config import *
+from decks import DeckStream
 
 FoldAction = namedtuple('FoldAction', [])
 CallAction = namedtuple('CallAction', [])
@@ -42,11 +44,13 @@ STATUS = lambda players: ''.join([PVALUE(p.name, p.bankroll) for p in players])
 # B**,**,**,**,** the board cards in common format
 # O**,** the opponent's hand in common format
 # D### the player's bankroll delta from the round
+# G new game: the player's bankroll, game clock and round number are reset
 # Q game over
 #
 # Clauses are separated by spaces
 # Messages end with '\n'
 # The engine expects a response of K at the end of the round as an ack,
+# a response of G to acknowledge a new game,
 # otherwise a response which encodes the player's action
 # Action history is sent once, including the player's actions
 
@@ -142,6 +146,60 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'final_street',
         return RoundState(self.button + 1, self.street, self.final_street, new_pips, new_stacks, self.hands, self.deck, self)
 
 
+class ForkedProcess():
+    '''
+    Stands in for the subprocess of a pokerbot forked by the pokerbot's fork server.
+    '''
+
+    def __init__(self, address, port):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.settimeout(CONNECT_TIMEOUT)
+            connection.connect(address)
+            connection.sendall('{}\n'.format(port).encode())
+            self.stdout = connection.makefile('rb')
+            self.pid = int(self.stdout.readline())
+            # the connection now carries the forked pokerbot's output
+            connection.settimeout(None)
+        except (OSError, ValueError):
+            connection.close()
+            raise
+        self.connection = connection
+
+    def poll(self):
+        '''
+        Returns None while the forked pokerbot is running, otherwise 0.
+        '''
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return 0
+        except PermissionError:  # the process id has been reused
+            return 0
+        return None
+
+    def communicate(self, timeout=None):
+        '''
+        Waits for the forked pokerbot to exit. Its output is read from stdout as it arrives.
+        '''
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.perf_counter() > deadline:
+                raise subprocess.TimeoutExpired('forked pokerbot', timeout)
+            time.sleep(0.01)
+        self.connection.close()
+        return b'', None
+
+    def kill(self):
+        '''
+        Kills the forked pokerbot.
+        '''
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
 class Player():
     '''
     Handles subprocess and socket interactions with one player's pokerbot.
@@ -202,9 +260,7 @@ class Player():
                     server_socket.settimeout(CONNECT_TIMEOUT)
                     server_socket.listen()
                     port = server_socket.getsockname()[1]
-                    proc = subprocess.Popen(self.commands['run'] + [str(port)],
-                                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                            cwd=self.path)
+                    proc = self.launch(port)
                     self.bot_subprocess = proc
                     # function for bot listening
                     def enqueue_output(out, queue):
@@ -229,7 +285,39 @@ class Player():
             except socket.timeout:
                 print('Timed out waiting for', self.name, 'to connect')
 
-    def stop(self):
+    def launch(self, port):
+        '''
+        Starts the pokerbot, forking it from its fork server if one is listening.
+        '''
+        if isinstance(self.commands.get('forkserver'), str):
+            address = os.path.join(self.path, self.commands['forkserver'])
+            try:
+                return ForkedProcess(address, port)
+            except (OSError, ValueError):
+                print(self.name, 'fork server not available - starting with "run"')
+        return subprocess.Popen(self.commands['run'] + [str(port)],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                cwd=self.path)
+
+    def reset(self, name):
+        '''
+        Starts a new game on the existing socket connection.
+        Returns True if the pokerbot acknowledged the new game.
+        '''
+        self.name = name
+        self.game_clock = STARTING_GAME_CLOCK
+        self.bankroll = 0
+        if self.socketfile is None:
+            return False
+        try:
+            self.socketfile.write('G\n')
+            self.socketfile.flush()
+            clause = self.socketfile.readline().strip()
+        except OSError:
+            return False
+        return clause == 'G'
+
+    def stop(self, log_filename=None):
         '''
         Closes the socket connection and stops the pokerbot.
         '''
@@ -250,9 +338,21 @@ class Player():
                 self.bot_subprocess.kill()
                 outs, _ = self.bot_subprocess.communicate()
                 self.bytes_queue.put(outs)
-        with open(self.name + '.txt', 'wb') as log_file:
+        self.write_log(log_filename)
+
+    def write_log(self, log_filename=None):
+        '''
+        Writes the pokerbot's output since the last log was written.
+        '''
+        outputs = []
+        try:
+            while True:
+                outputs.append(self.bytes_queue.get_nowait())
+        except Empty:
+            pass
+        with open(log_filename or self.name + '.txt', 'wb') as log_file:
             bytes_written = 0
-            for output in self.bytes_queue.queue:
+            for output in outputs:
                 try:
                     bytes_written += log_file.write(output)
                     if bytes_written >= PLAYER_LOG_SIZE_LIMIT:
@@ -306,14 +406,84 @@ class Player():
         return CheckAction() if CheckAction in legal_actions else FoldAction()
 
 
+class PlayerPool():
+    '''
+    Keeps pokerbots connected between games and hands them to the next game instead of restarting them.
+    '''
+
+    def __init__(self):
+        self.idle = {}
+
+    def acquire(self, name, path):
+        '''
+        Returns a connected pokerbot from path, reusing an idle one if it accepts a new game.
+        '''
+        idle = self.idle.get(path, [])
+        while idle:
+            player = idle.pop()
+            if player.reset(name):
+                return player
+            print(name, 'did not acknowledge a new game - restarting')
+            player.stop(os.devnull)
+        player = Player(name, path)
+        player.build()
+        player.run()
+        return player
+
+    def release(self, player, log_filename=None):
+        '''
+        Writes the pokerbot's log and keeps it for the next game if it is still responsive.
+        '''
+        if player.socketfile is None or player.game_clock <= 0.:
+            player.stop(log_filename)
+            return
+        player.write_log(log_filename)
+        self.idle.setdefault(player.path, []).append(player)
+
+    def close(self):
+        '''
+        Stops all idle pokerbots.
+        '''
+        for players in self.idle.values():
+            for player in players:
+                player.stop(os.devnull)
+        self.idle = {}
+
+
 class Game():
     '''
     Manages logging and the high-level game procedure.
     '''
 
-    def __init__(self):
+    def __init__(self, game_num=None):
         self.log = ['6.176 MIT Pokerbots - ' + PLAYER_1_NAME + ' vs ' + PLAYER_2_NAME]
         self.player_messages = [[], []]
+        self.deck_stream = None
+        # consecutive games are numbered in log names and deal from distinct seeds
+        self.game_num = game_num
+        self.suffix = '' if game_num is None else '_' + str(game_num)
+
+    def load_deck_stream(self):
+        '''
+        Replays the decks in this game's deck stream file if it exists, otherwise deals from DECK_SEED.
+        Consecutive games keep their decks in DECK_STREAM_FILENAME numbered like their logs.
+        '''
+        filename = None
+        if DECK_STREAM_FILENAME is not None:
+            root, extension = os.path.splitext(DECK_STREAM_FILENAME)
+            filename = root + self.suffix + extension
+        if filename is not None and os.path.isfile(filename):
+            print('Dealing decks from', filename)
+            self.deck_stream = DeckStream.load(filename)
+            if len(self.deck_stream.decks) < NUM_ROUNDS:
+                raise ValueError('{} holds {} decks but NUM_ROUNDS is {}'.format(
+                    filename, len(self.deck_stream.decks), NUM_ROUNDS))
+            return
+        seed = DECK_SEED if DECK_SEED is None or self.game_num is None else [DECK_SEED, self.game_num]
+        self.deck_stream = DeckStream(seed)
+        if filename is not None:
+            print('Writing', filename)
+            self.deck_stream.save(filename, NUM_ROUNDS)
 
     def log_round_state(self, players, round_state):
         '''
@@ -379,19 +549,10 @@ class Game():
 
         # RIVER OF BLOOD VARIANT ENTAILS THAT CARDS MAY CONTINUE TO BE DEALT PAST THE RIVER UNTIL A BLACK CARD IS DEALT
 
-        deck = eval7.Deck()
-        deck.shuffle()
+        # the deck stream precomputes each deck's final street
+        deck, FINAL_STREET = self.deck_stream.deal()
         hands = [deck.deal(2), deck.deal(2)]
 
-        # eval7 card suits are defined as ('c', 'd', 'h', 's')
-        
-        FINAL_STREET = 5 
-        while deck.cards[FINAL_STREET-1].suit == 1 or deck.cards[FINAL_STREET-1].suit == 2:
-            FINAL_STREET += 1
-        
-        if FINAL_STREET > 48:
-            FINAL_STREET = 48
-
         pips = [SMALL_BLIND, BIG_BLIND]
         stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
         round_state = RoundState(0, 0, FINAL_STREET, pips, stacks, hands, deck, None)
@@ -408,9 +569,9 @@ class Game():
             player.query(round_state, player_message, self.log)
             player.bankroll += delta
 
-    def run(self):
+    def run(self, pool=None):
         '''
-        Runs one game of poker.
+        Runs one game of poker, taking the pokerbots from pool if one is given.
         '''
         print('   __  _____________  ___       __           __        __    ')
         print('  /  |/  /  _/_  __/ / _ \\___  / /_____ ____/ /  ___  / /____')
@@ -418,13 +579,20 @@ class Game():
         print('/_/  /_/___/ /_/   /_/   \\___/_/\\_\\\\__/_/ /_.__/\\___/\\__/___/')
         print()
         print('Starting the Pokerbots engine...')
-        players = [
-            Player(PLAYER_1_NAME, PLAYER_1_PATH),
-            Player(PLAYER_2_NAME, PLAYER_2_PATH)
-        ]
-        for player in players:
-            player.build()
-            player.run()
+        self.load_deck_stream()
+        if pool is None:
+            players = [
+                Player(PLAYER_1_NAME, PLAYER_1_PATH),
+                Player(PLAYER_2_NAME, PLAYER_2_PATH)
+            ]
+            for player in players:
+                player.build()
+                player.run()
+        else:
+            players = [
+                pool.acquire(PLAYER_1_NAME, PLAYER_1_PATH),
+                pool.acquire(PLAYER_2_NAME, PLAYER_2_PATH)
+            ]
         for round_num in range(1, NUM_ROUNDS + 1):
             self.log.append('')
             self.log.append('Round #' + str(round_num) + STATUS(players))
@@ -433,12 +601,22 @@ class Game():
         self.log.append('')
         self.log.append('Final' + STATUS(players))
         for player in players:
-            player.stop()
-        name = GAME_LOG_FILENAME + '.txt'
+            log_filename = player.name + self.suffix + '.txt'
+            if pool is None:
+                player.stop(log_filename)
+            else:
+                pool.release(player, log_filename)
+        name = GAME_LOG_FILENAME + self.suffix + '.txt'
         print('Writing', name)
         with open(name, 'w') as log_file:
             log_file.write('\n'.join(self.log))
 
 
 if __name__ == '__main__':
-    Game().run()
+    if NUM_GAMES == 1:
+        Game().run()
+    else:
+        player_pool = PlayerPool()
+        for game_num in range(1, NUM_GAMES + 1):
+            Game(game_num).run(player_pool)
+        player_pool.close()
@@ -0,0 +1,495 @@
+'''
+Computes best responses to a strategy table and its exploitability under River of Blood rules.
+
+Usage: python3 exploitability.py [STRATEGY]
+
+A strategy table is an .npz file written by save_strategy. It maps the history of a decision point,
+the space-separated action codes of the socket encoding leading to it from the start of the round
+(e.g. 'C R8'), to an array of action probabilities with one row per card bucket. Actions are ordered
+as returned by abstract_actions. Decision points missing from the table play uniformly at random.
+
+Cards are bucketed by the card abstraction the strategy plays with. By default, preflop hands fall
+into their 169 suit-isomorphic classes and later hands into rank percentiles on the board; with
+--bucket-table, hands are bucketed by the tables bucketing.py writes, as skeleton.buckets.BucketTable
+does in a bot.
+
+The best response uses the same bet abstraction but knows its exact hand. Chance is sampled:
+flops, then turns per flop, rivers per turn, and orderings of the rest of the deck per river, with
+as many cards branching per board as there are streets to bet on. Boards sharing the cards dealt
+so far are grouped, so the best response does not see cards before they are dealt. It still picks
+its actions against a small sample of the cards to come, which biases the reported exploitability
+upward; the bias shrinks as more turns, rivers and runouts are sampled.
+'''
+from collections import namedtuple
+from multiprocessing import Pool
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+from decks import CARDS, final_streets
+from hands import NUM_HANDS, PREFLOP_CLASSES, HANDS, Showdown, board_conflicts, opponent_mass, rank_hands
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_skeleton'))
+from skeleton.actions import FoldAction, CallAction, CheckAction, RaiseAction
+from skeleton.states import TerminalState, RoundState, STARTING_STACK, BIG_BLIND, SMALL_BLIND
+from skeleton.buckets import SUIT_PERMUTATIONS, RIVER_STREET, BucketTable, board_colex, river_row
+
+# raise_sizes: bets and raises as fractions of the pot after calling, besides all-in
+# max_raises: bets and raises allowed per street
+# raise_streets: bets and raises are allowed on streets before this one
+# num_buckets: hand strength buckets after the flop for StrengthBuckets
+Abstraction = namedtuple('Abstraction', ['raise_sizes', 'max_raises', 'raise_streets', 'num_buckets'])
+DEFAULT_ABSTRACTION = Abstraction((1.,), 2, 6, 8)
+# probability of each ordered pair of hands before the board is dealt
+PREFLOP_WEIGHT = 1. / (NUM_HANDS * (50 * 49 // 2))
+
+
+def abstract_actions(round_state, raises, abstraction):
+    '''
+    Returns the (code, action) pairs available in the abstract game.
+
+    Arguments:
+    round_state: the RoundState.
+    raises: the number of bets and raises made on this street.
+    abstraction: the Abstraction.
+    '''
+    legal_actions = round_state.legal_actions()
+    actions = []
+    if FoldAction in legal_actions:
+        actions.append(('F', FoldAction()))
+    if CheckAction in legal_actions:
+        actions.append(('K', CheckAction()))
+    if CallAction in legal_actions:
+        actions.append(('C', CallAction()))
+    if (RaiseAction in legal_actions and raises < abstraction.max_raises and
+            round_state.street < abstraction.raise_streets):
+        active = round_state.button % 2
+        min_raise, max_raise = round_state.raise_bounds()
+        continue_cost = round_state.pips[1-active] - round_state.pips[active]
+        pot = 2 * STARTING_STACK - round_state.stacks[0] - round_state.stacks[1] + continue_cost
+        amounts = {max_raise}
+        for size in abstraction.raise_sizes:
+            amount = round_state.pips[active] + continue_cost + int(size * pot)
+            amounts.add(min(max(amount, min_raise), max_raise))
+        actions.extend(('R' + str(amount), RaiseAction(amount)) for amount in sorted(amounts))
+    return actions
+
+
+def initial_state():
+    '''
+    Returns the RoundState after the blinds are posted.
+    '''
+    pips = [SMALL_BLIND, BIG_BLIND]
+    stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
+    return RoundState(0, 0, pips, stacks, [[], []], [], None)
+
+
+def save_strategy(filename, tables, abstraction):
+    '''
+    Writes a strategy table mapping histories to arrays of action probabilities per bucket.
+    '''
+    arrays = {'h:' + history: np.asarray(table, dtype=np.float32) for history, table in tables.items()}
+    arrays['raise_sizes'] = np.array(abstraction.raise_sizes)
+    arrays['limits'] = np.array([abstraction.max_raises, abstraction.raise_streets, abstraction.num_buckets])
+    with open(filename, 'wb') as strategy_file:
+        np.savez(strategy_file, **arrays)
+
+
+def load_strategy(filename):
+    '''
+    Reads a strategy table, returning the tables with normalized rows and the Abstraction.
+    '''
+    tables = {}
+    with np.load(filename) as arrays:
+        for key in arrays.files:
+            if key.startswith('h:'):
+                table = arrays[key].astype(np.float64)
+                tables[key[2:]] = table / table.sum(axis=1, keepdims=True)
+        max_raises, raise_streets, num_buckets = arrays['limits'].tolist()
+        abstraction = Abstraction(tuple(arrays['raise_sizes'].tolist()), max_raises, raise_streets, num_buckets)
+    return tables, abstraction
+
+
+def strength_buckets(ranks, num_buckets):
+    '''
+    Buckets hands by their rank percentile among the hands not sharing a card with the board.
+    '''
+    valid = ranks >= 0
+    ordered = np.sort(ranks[valid])
+    percentiles = (np.searchsorted(ordered, ranks, 'left') + np.searchsorted(ordered, ranks, 'right')) / 2
+    buckets = (percentiles * num_buckets / max(len(ordered), 1)).astype(np.int64)
+    return np.where(valid, np.minimum(buckets, num_buckets - 1), 0)
+
+
+class StrengthBuckets():
+    '''
+    The default card abstraction: preflop classes, then rank percentiles on the board.
+    '''
+
+    def __init__(self, num_buckets):
+        self.num_buckets = num_buckets
+
+    def hand_buckets(self, board):
+        '''
+        Returns the bucket of every hand on a board of card indices in the order they were dealt.
+        Hands sharing a card with the board may be given any bucket.
+        '''
+        if len(board) == 0:
+            return PREFLOP_CLASSES
+        return strength_buckets(rank_hands(board), self.num_buckets)
+
+
+class TableBuckets():
+    '''
+    The card abstraction of the bucket tables in a directory written by bucketing.py.
+    Tabulated streets are looked up for all hands at once, as BucketTable.bucket does for one.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.table = BucketTable(directory)
+
+    # worker processes reopen the memory-mapped tables
+    def __getstate__(self):
+        return self.directory
+
+    def __setstate__(self, directory):
+        self.__init__(directory)
+
+    def hand_buckets(self, board):
+        '''
+        Returns the bucket of every hand on a board of card indices in the order they were dealt.
+        Hands sharing a card with the board may be given any bucket.
+        '''
+        street = len(board)
+        if street not in self.table.buckets:
+            board_strings = [str(CARDS[card]) for card in board]
+            buckets = np.zeros(NUM_HANDS, dtype=np.int64)
+            for hand in np.flatnonzero(~board_conflicts(board)).tolist():
+                buckets[hand] = self.table.strength_bucket([str(CARDS[card]) for card in HANDS[hand]],
+                                                           board_strings, self.table.run_buckets)
+            return buckets
+        code = int(self.table.board_indices[street][board_colex(sorted(board))])
+        row, permutation = divmod(code, len(SUIT_PERMUTATIONS))
+        if street == RIVER_STREET:
+            row = river_row(row, board[-1])
+        suits = np.array(SUIT_PERMUTATIONS[permutation])
+        permuted = np.sort(HANDS - HANDS % 4 + suits[HANDS % 4], axis=1)
+        first, second = permuted[:, 0], permuted[:, 1]
+        # as skeleton.buckets.hand_index
+        indices = 51 * first - first * (first - 1) // 2 + second - first - 1
+        return np.asarray(self.table.buckets[street][row], dtype=np.int64)[indices]
+
+
+def best_values(values, group_size):
+    '''
+    Picks, for each hand and each group of boards sharing the cards dealt so far,
+    the action with the highest total value.
+
+    Arguments:
+    values: an array of values indexed by action, board and hand.
+    group_size: the number of consecutive boards per group.
+    '''
+    num_actions, num_boards, num_hands = values.shape
+    grouped = values.reshape(num_actions, num_boards // group_size, group_size, num_hands)
+    best = grouped.sum(axis=2).argmax(axis=0)
+    chosen = np.take_along_axis(grouped, best[None, :, None, :], axis=0)
+    return chosen.reshape(num_boards, num_hands)
+
+
+class PreflopBoards():
+    '''
+    The chance context before the flop, where every hand is possible.
+    Records the opponent's reach at each flop, or looks up the values of flops computed by the workers.
+    '''
+
+    def __init__(self, card_abstraction, flop_values=None):
+        self.flop_values = flop_values
+        self.flops = {}
+        self.preflop_buckets = card_abstraction.hand_buckets([])[None, :]
+
+    def fold(self, reach, payoff):
+        return payoff * PREFLOP_WEIGHT * opponent_mass(reach)
+
+    def street_over(self, best_response, round_state, history, reach):
+        if self.flop_values is None:
+            self.flops[history] = (round_state, reach[0])
+            return np.zeros_like(reach)
+        return self.flop_values[history][None, :]
+
+    def best(self, values, street):
+        return best_values(values, 1)
+
+    def buckets(self, street):
+        return self.preflop_buckets
+
+
+class SampledBoards():
+    '''
+    The chance context after the flop: sampled boards, grouped by flop and then by turn.
+    '''
+
+    def __init__(self, boards, branching, card_abstraction):
+        self.boards = boards
+        self.branching = branching
+        self.card_abstraction = card_abstraction
+        self.final_streets = final_streets(boards, dealt=0).astype(np.int64)
+        used = np.zeros(boards.shape, dtype=bool)
+        used[np.arange(len(boards))[:, None], boards] = np.arange(boards.shape[1]) < self.final_streets[:, None]
+        self.compatible = ~(used[:, HANDS[:, 0]] | used[:, HANDS[:, 1]])
+        remaining = boards.shape[1] - self.final_streets
+        pairs = remaining * (remaining - 1) // 2 * (remaining - 2) * (remaining - 3) // 2
+        self.weights = 1. / pairs
+        self.showdown = Showdown(np.array([rank_hands(board[:street]) for board, street in
+                                           zip(boards.tolist(), self.final_streets.tolist())]))
+        self.rows = None
+        self.bucket_cache = {}
+
+    @classmethod
+    def sample(cls, rng, num_flops, branching, card_abstraction):
+        '''
+        Samples boards for num_flops flops.
+
+        Arguments:
+        branching: the number of cards dealt per board for each card after the flop in turn,
+        then the number of orderings of the rest of the deck, as returned by sample_branching.
+        '''
+        boards = []
+
+        def deal(board, rest, level):
+            if level == len(branching) - 1:
+                boards.extend(np.concatenate((board, rng.permutation(rest))) for _ in range(branching[level]))
+                return
+            for index in rng.choice(len(rest), branching[level], replace=False):
+                deal(np.append(board, rest[index]), np.delete(rest, index), level + 1)
+        for _ in range(num_flops):
+            deck = rng.permutation(52)
+            deal(deck[:3], deck[3:], 0)
+        return cls(np.array(boards), branching, card_abstraction)
+
+    def subset(self, rows):
+        '''
+        Returns the context restricted to some boards, which must not share groups with the others.
+        '''
+        subset = SampledBoards.__new__(SampledBoards)
+        subset.boards = self.boards[rows]
+        subset.branching = self.branching
+        subset.card_abstraction = self.card_abstraction
+        subset.final_streets = self.final_streets[rows]
+        subset.compatible = self.compatible[rows]
+        subset.weights = self.weights[rows]
+        subset.showdown = self.showdown
+        subset.rows = rows if self.rows is None else self.rows[rows]
+        subset.bucket_cache = {street: buckets[rows] for street, buckets in self.bucket_cache.items()}
+        return subset
+
+    def group_size(self, street):
+        # boards sharing the first street cards differ in the cards dealt at the levels after them
+        return int(np.prod(self.branching[street - 3:]))
+
+    def fold(self, reach, payoff):
+        return payoff * opponent_mass(reach) * self.compatible
+
+    def showdown_values(self, round_state, reach, rows=None):
+        '''
+        Returns the values of showdowns on the given boards, defaulting to all of them.
+        '''
+        contribution = STARTING_STACK - round_state.stacks[0]
+        compatible = self.compatible
+        if rows is not None:
+            compatible = compatible[rows]
+        if self.rows is not None:
+            rows = self.rows if rows is None else self.rows[rows]
+        return contribution * self.showdown.mass(reach, rows) * compatible
+
+    def street_over(self, best_response, round_state, history, reach):
+        if round_state.street >= best_response.abstraction.raise_streets or 0 in round_state.stacks:
+            # nobody can bet any more, so every board is checked down to its final street
+            return self.showdown_values(round_state, reach)
+        previous_street = round_state.street - 1
+        if previous_street < 5:
+            return best_response.traverse(self, round_state, history, 0, reach)
+        values = np.zeros_like(reach)
+        over = np.flatnonzero(self.final_streets == previous_street)
+        if len(over) > 0:
+            values[over] = self.showdown_values(round_state, reach[over], over)
+        going_on = self.final_streets > previous_street
+        if going_on.any():
+            rows = np.flatnonzero(going_on)
+            values[rows] = best_response.traverse(self.subset(rows), round_state, history, 0, reach[rows])
+        return values
+
+    def best(self, values, street):
+        return best_values(values, self.group_size(street))
+
+    def buckets(self, street):
+        if street not in self.bucket_cache:
+            group_size = self.group_size(street)
+            groups = [self.card_abstraction.hand_buckets(board[:street])
+                      for board in self.boards[::group_size].tolist()]
+            self.bucket_cache[street] = np.repeat(np.array(groups), group_size, axis=0)
+        return self.bucket_cache[street]
+
+
+class BestResponse():
+    '''
+    Computes the values of a best response to a strategy table, vectorized over boards and hands.
+    '''
+
+    def __init__(self, tables, abstraction, player):
+        self.tables = tables
+        self.abstraction = abstraction
+        self.player = player
+
+    def traverse(self, boards, round_state, history, raises, reach):
+        '''
+        Returns the best response's values at a decision point for each board and hand.
+
+        Arguments:
+        boards: the chance context.
+        round_state: the RoundState at the decision point.
+        history: the action codes leading to the decision point.
+        raises: the number of bets and raises made on this street.
+        reach: the opponent's probability-weighted reach for each board and hand.
+        '''
+        actions = abstract_actions(round_state, raises, self.abstraction)
+        if len(actions) == 1:
+            return self.proceed(boards, round_state, history, raises, reach, *actions[0])
+        if round_state.button % 2 == self.player:
+            values = np.array([self.proceed(boards, round_state, history, raises, reach, code, action)
+                               for code, action in actions])
+            return boards.best(values, round_state.street)
+        table = self.tables.get(history)
+        if table is None:
+            probabilities = np.full(reach.shape + (len(actions),), 1. / len(actions))
+        else:
+            probabilities = table[boards.buckets(round_state.street)]
+        values = 0.
+        for i, (code, action) in enumerate(actions):
+            values = values + self.proceed(boards, round_state, history, raises,
+                                           reach * probabilities[..., i], code, action)
+        return values
+
+    def proceed(self, boards, round_state, history, raises, reach, code, action):
+        '''
+        Returns the best response's values after an action.
+        '''
+        history = history + ' ' + code if history else code
+        next_state = round_state.proceed(action)
+        if isinstance(next_state, TerminalState):  # a fold
+            active = round_state.button % 2
+            if active == self.player:
+                payoff = round_state.stacks[self.player] - STARTING_STACK
+            else:
+                payoff = STARTING_STACK - round_state.stacks[1-self.player]
+            return boards.fold(reach, payoff)
+        if next_state.street != round_state.street:
+            return boards.street_over(self, next_state, history, reach)
+        return self.traverse(boards, next_state, history, raises + (code[0] == 'R'), reach)
+
+
+# each worker process evaluates the flops of its tasks against every preflop line
+_worker = {}
+
+
+def _init_worker(tables, abstraction, flops, num_flops, branching, card_abstraction):
+    _worker['responses'] = [BestResponse(tables, abstraction, player) for player in range(2)]
+    _worker['flops'] = flops
+    _worker['sampling'] = (num_flops, branching, card_abstraction)
+
+
+def _evaluate_flops(seed):
+    boards = SampledBoards.sample(np.random.default_rng(seed), *_worker['sampling'])
+    totals = {}
+    for player, best_response in enumerate(_worker['responses']):
+        for history, (round_state, reach) in _worker['flops'][player].items():
+            flop_reach = reach[None, :] * boards.compatible * boards.weights[:, None]
+            values = best_response.traverse(boards, round_state, history, 0, flop_reach)
+            totals[player, history] = values.sum(axis=0)
+    return totals, len(boards.boards)
+
+
+def sample_branching(abstraction, num_turns, num_rivers, num_runouts):
+    '''
+    Returns how many cards to deal per board for each card after the flop that is followed by
+    betting, then how many orderings of the rest of the deck to deal.
+    '''
+    # past the river, each card dealt before a street with betting branches like a runout
+    return (num_turns, num_rivers) + (num_runouts,) * max(abstraction.raise_streets - 6, 0) + (num_runouts,)
+
+
+def best_response_values(tables, abstraction, num_flops=256, num_turns=4, num_rivers=4, num_runouts=4,
+                         flops_per_task=4, processes=None, seed=None, card_abstraction=None):
+    '''
+    Returns the expected payoffs per round of a best response to the strategy in each seat,
+    with player 0 posting the small blind.
+
+    The card abstraction defaults to StrengthBuckets with the Abstraction's number of buckets.
+    '''
+    if card_abstraction is None:
+        card_abstraction = StrengthBuckets(abstraction.num_buckets)
+    flops = []
+    for player in range(2):
+        preflop = PreflopBoards(card_abstraction)
+        BestResponse(tables, abstraction, player).traverse(preflop, initial_state(), '', 0, np.ones((1, NUM_HANDS)))
+        flops.append(preflop.flops)
+    seeds = np.random.SeedSequence(seed).spawn(max(num_flops // flops_per_task, 1))
+    totals = {}
+    num_boards = 0
+    branching = sample_branching(abstraction, num_turns, num_rivers, num_runouts)
+    initargs = (tables, abstraction, flops, flops_per_task, branching, card_abstraction)
+    with Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        for task_totals, task_boards in pool.imap_unordered(_evaluate_flops, seeds):
+            num_boards += task_boards
+            for key, values in task_totals.items():
+                totals[key] = totals.get(key, 0.) + values
+    payoffs = []
+    for player in range(2):
+        flop_values = {history: totals[player, history] / num_boards for history in flops[player]}
+        values = BestResponse(tables, abstraction, player).traverse(
+            PreflopBoards(card_abstraction, flop_values), initial_state(), '', 0, np.ones((1, NUM_HANDS)))
+        payoffs.append(float(values.sum()))
+    return payoffs
+
+
+def main():
+    '''
+    Prints the exploitability of the strategy table given on the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 exploitability.py')
+    parser.add_argument('strategy', type=str, nargs='?', help='Strategy table, defaults to uniformly random play')
+    parser.add_argument('--raise-sizes', type=str, default=','.join(str(size) for size in DEFAULT_ABSTRACTION.raise_sizes),
+                        help='Pot fractions to bet, without a strategy table')
+    parser.add_argument('--max-raises', type=int, default=DEFAULT_ABSTRACTION.max_raises)
+    parser.add_argument('--raise-streets', type=int, default=DEFAULT_ABSTRACTION.raise_streets)
+    parser.add_argument('--buckets', type=int, default=DEFAULT_ABSTRACTION.num_buckets)
+    parser.add_argument('--bucket-table', type=str, default=None,
+                        help='Directory of bucket tables written by bucketing.py, defaults to hand strength buckets')
+    parser.add_argument('--flops', type=int, default=256, help='Flops sampled, defaults to 256')
+    parser.add_argument('--turns', type=int, default=4, help='Turns sampled per flop, defaults to 4')
+    parser.add_argument('--rivers', type=int, default=4, help='Rivers sampled per turn, defaults to 4')
+    parser.add_argument('--runouts', type=int, default=4,
+                        help='Orderings of the rest of the deck sampled per river, defaults to 4')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the CPU count')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    if args.strategy is None:
+        tables = {}
+        abstraction = Abstraction(tuple(float(size) for size in args.raise_sizes.split(',')),
+                                  args.max_raises, args.raise_streets, args.buckets)
+    else:
+        tables, abstraction = load_strategy(args.strategy)
+    card_abstraction = None if args.bucket_table is None else TableBuckets(args.bucket_table)
+    start_time = time.perf_counter()
+    payoffs = best_response_values(tables, abstraction, args.flops, args.turns, args.rivers, args.runouts,
+                                   processes=args.processes, seed=args.seed, card_abstraction=card_abstraction)
+    for player, payoff in enumerate(payoffs):
+        print('Best response as player {}: {:.3f} chips/round'.format(player, payoff))
+    exploitability = sum(payoffs) / 2 / BIG_BLIND * 1000
+    print('Exploitability: {:.1f} mbb/hand ({:.1f}s)'.format(exploitability, time.perf_counter() - start_time))
+
+
+if __name__ == '__main__':
+    main()
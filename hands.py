@@ -0,0 +1,160 @@
+'''
+Tables over the 1326 two-card hands, indexed consistently with the card indices in decks.py.
+'''
+from itertools import combinations
+import numpy as np
+import eval7
+
+from decks import CARDS
+
+# HANDS[h] holds the two card indices of hand h, lowest first
+HANDS = np.array(list(combinations(range(len(CARDS)), 2)), dtype=np.int64)
+NUM_HANDS = len(HANDS)
+# HAND_CARDS[h, c] is 1 if hand h holds card c
+HAND_CARDS = np.zeros((NUM_HANDS, len(CARDS)))
+HAND_CARDS[np.arange(NUM_HANDS), HANDS[:, 0]] = 1
+HAND_CARDS[np.arange(NUM_HANDS), HANDS[:, 1]] = 1
+# CARD_HANDS[c] lists the 51 hands holding card c, and HAND_POSITIONS[h, i] is where hand h
+# appears in CARD_HANDS[HANDS[h, i]]
+CARD_HANDS = np.array([np.flatnonzero(HAND_CARDS[:, card]) for card in range(len(CARDS))])
+HAND_POSITIONS = np.zeros((NUM_HANDS, 2), dtype=np.int64)
+for _card, _hands in enumerate(CARD_HANDS):
+    for _position, _hand in enumerate(_hands):
+        HAND_POSITIONS[_hand, 0 if HANDS[_hand, 0] == _card else 1] = _position
+
+
+def preflop_class(first, second):
+    '''
+    Returns the index from 0 to 168 of a hand's suit-isomorphic preflop class.
+    '''
+    high, low = max(first // 4, second // 4), min(first // 4, second // 4)
+    if high == low:
+        return high
+    # 13 pairs, then 78 suited and 78 offsuit rank combinations
+    offset = 13 if first % 4 == second % 4 else 91
+    return offset + high * (high - 1) // 2 + low
+
+
+PREFLOP_CLASSES = np.array([preflop_class(first, second) for first, second in HANDS])
+
+
+def board_conflicts(board):
+    '''
+    Returns a mask of the hands sharing a card with a board of card indices.
+    '''
+    used = np.zeros(len(CARDS), dtype=bool)
+    used[list(board)] = True
+    return used[HANDS[:, 0]] | used[HANDS[:, 1]]
+
+
+def rank_hands(board):
+    '''
+    Evaluates every hand with a board of card indices.
+    Hands sharing a card with the board are ranked -1.
+    '''
+    board_cards = [CARDS[card] for card in board]
+    conflicts = board_conflicts(board)
+    ranks = np.full(NUM_HANDS, -1, dtype=np.int64)
+    for hand in np.flatnonzero(~conflicts).tolist():
+        first, second = HANDS[hand]
+        ranks[hand] = eval7.evaluate(board_cards + [CARDS[first], CARDS[second]])
+    return ranks
+
+
+def opponent_mass(reach):
+    '''
+    Sums the opponent's reach over the hands compatible with each of our hands.
+
+    Arguments:
+    reach: an array whose last axis holds the opponent's reach per hand.
+    '''
+    card_mass = reach @ HAND_CARDS
+    return (reach.sum(axis=-1, keepdims=True) - card_mass[..., HANDS[:, 0]] - card_mass[..., HANDS[:, 1]]
+            + reach)
+
+
+def rank_bounds(ranks):
+    '''
+    Returns, for each entry, the number of entries in its row ranked strictly lower, and ranked lower or equal.
+    '''
+    rows, width = ranks.shape
+    # search all rows at once by moving each row's ranks into its own range
+    offsets = np.arange(rows)[:, None] * (1 << 32)
+    keys = (ranks + offsets).ravel()
+    sorted_keys = (np.sort(ranks, axis=1) + offsets).ravel()
+    starts = np.arange(rows)[:, None] * width
+    lower = np.searchsorted(sorted_keys, keys, 'left').reshape(rows, width) - starts
+    upper = np.searchsorted(sorted_keys, keys, 'right').reshape(rows, width) - starts
+    return lower, upper
+
+
+class Showdown():
+    '''
+    Precomputed hand orderings for showdowns on a set of boards.
+
+    Within a row of entries sorted by rank, with C the cumulative sums of their reach from the row start s,
+    the reach ranked lower minus the reach ranked higher than an entry is C[s+lower] + C[s+upper] - C[s] - C[s+width].
+    Each row's reach is summed in one flat cumulative sum, and the bounds are kept as flat indices into it.
+    '''
+
+    def __init__(self, ranks):
+        num_rows = len(ranks)
+        card_width = CARD_HANDS.shape[1]
+        card_ranks = ranks[:, CARD_HANDS].reshape(-1, card_width)
+        # indices within each board's row of reach, in rank order
+        self.hand_order = np.argsort(ranks, axis=1)
+        card_order = np.take_along_axis(np.tile(CARD_HANDS, (num_rows, 1)), np.argsort(card_ranks, axis=1), axis=1)
+        self.card_order = card_order.reshape(num_rows, -1)
+        # indices within each board's block of cumulative sums
+        lower, upper = rank_bounds(ranks)
+        self.hand_bounds = (lower, upper)
+        card_lower, card_upper = rank_bounds(card_ranks)
+        self.card_bounds = []
+        for i in range(2):
+            starts = HANDS[:, i] * card_width
+            for bounds in (card_lower, card_upper):
+                bounds = bounds.reshape(num_rows, len(CARDS), card_width)
+                self.card_bounds.append(starts + bounds[:, HANDS[:, i], HAND_POSITIONS[:, i]])
+        self.all_rows = self.indices(None)
+
+    def indices(self, rows):
+        '''
+        Returns the flat indices for reach given for some boards, defaulting to all of them.
+        '''
+        def flat(relative, stride):
+            if rows is not None:
+                relative = relative[rows]
+            return relative + np.arange(len(relative))[:, None] * stride
+        card_stride = len(CARDS) * CARD_HANDS.shape[1]
+        return (flat(self.hand_order, NUM_HANDS), flat(self.card_order, NUM_HANDS),
+                [flat(bounds, NUM_HANDS) for bounds in self.hand_bounds],
+                [flat(bounds, card_stride) for bounds in self.card_bounds])
+
+    def mass(self, reach, rows=None):
+        '''
+        Sums the opponent's reach over the compatible hands each of our hands beats, minus those it loses to.
+
+        Arguments:
+        reach: the opponent's reach per hand with one board per row.
+        rows: the boards reach is given for, defaults to all of them.
+        '''
+        hand_order, card_order, hand_bounds, card_bounds = self.all_rows if rows is None else self.indices(rows)
+        hands = cumulative(reach.take(hand_order))
+        cards = cumulative(reach.take(card_order))
+        row_starts = hands[::NUM_HANDS]
+        mass = hands.take(hand_bounds[0]) + hands.take(hand_bounds[1]) - (row_starts[:-1] + row_starts[1:])[:, None]
+        # remove the opponent hands sharing a card with ours; our own hand is neither lower nor higher
+        card_starts = cards[::CARD_HANDS.shape[1]]
+        card_rows = (card_starts[:-1] + card_starts[1:]).reshape(len(reach), len(CARDS))
+        for i in range(2):
+            mass -= cards.take(card_bounds[2 * i]) + cards.take(card_bounds[2 * i + 1]) - card_rows[:, HANDS[:, i]]
+        return mass
+
+
+def cumulative(values):
+    '''
+    Returns the cumulative sums of all values, starting from 0.
+    '''
+    sums = np.zeros(values.size + 1)
+    np.cumsum(values, out=sums[1:])
+    return sums
@@ -0,0 +1,163 @@
+'''
+Reads recorded hand histories, either game logs written by the engine or structured JSON histories.
+'''
+from collections import namedtuple
+import json
+import re
+
+# names: the players' names, small blind first
+# bankrolls: the players' bankrolls at the start of the round
+# hands: the players' hole cards, as lists of strings like 'Ah'
+# events: tuples in the order they were logged, one of
+#   ('board', street, cards)
+#   ('action', seat, code) where code is the socket encoding of the action
+#   ('error', seat, message) logged when the engine overrode or stopped querying a player
+#   ('show', seat, cards)
+#   ('award', seat, delta)
+RecordedRound = namedtuple('RecordedRound', ['round_num', 'names', 'bankrolls', 'hands', 'events'])
+
+ROUND_PATTERN = re.compile(r'Round #(\d+), (.+?) \((-?\d+)\), (.+?) \((-?\d+)\)$')
+CARDS_PATTERN = re.compile(r'\[(.*)\]')
+STREET_NAMES = ('Flop', 'Turn', 'River', 'Run')
+ERROR_PHRASES = (' attempted illegal ', ' ran out of time', ' disconnected', ' response misformatted')
+# after these errors the engine stops querying the player for the rest of the game
+FATAL_ERRORS = ('ran out of time', 'disconnected')
+
+
+def parse_cards(text):
+    '''
+    Reads the cards printed in brackets by the engine.
+    '''
+    return CARDS_PATTERN.search(text).group(1).split()
+
+
+def parse_line(line, names):
+    '''
+    Converts one line of a game log into a round event, or returns None if it carries no event.
+    '''
+    if line.startswith(STREET_NAMES):
+        cards = parse_cards(line)
+        return ('board', len(cards), cards)
+    for seat, name in enumerate(names):
+        if not line.startswith(name + ' '):
+            continue
+        rest = line[len(name):]
+        if rest.startswith(ERROR_PHRASES):
+            return ('error', seat, rest.strip())
+        if rest == ' folds':
+            return ('action', seat, 'F')
+        if rest == ' calls':
+            return ('action', seat, 'C')
+        if rest == ' checks':
+            return ('action', seat, 'K')
+        if rest.startswith(' bets '):
+            return ('action', seat, 'R' + rest[len(' bets '):])
+        if rest.startswith(' raises to '):
+            return ('action', seat, 'R' + rest[len(' raises to '):])
+        if rest.startswith(' shows '):
+            return ('show', seat, parse_cards(rest))
+        if rest.startswith(' awarded '):
+            return ('award', seat, int(rest[len(' awarded '):]))
+        return None
+    return None
+
+
+def parse_gamelog(filename):
+    '''
+    Reads the rounds of a game log written by the engine.
+    '''
+    rounds = []
+    with open(filename, 'r') as log_file:
+        lines = log_file.read().split('\n')
+    current = None
+    for line in lines:
+        match = ROUND_PATTERN.match(line)
+        if match is not None:
+            names = [match.group(2), match.group(4)]
+            bankrolls = [int(match.group(3)), int(match.group(5))]
+            current = RecordedRound(int(match.group(1)), names, bankrolls, [[], []], [])
+            rounds.append(current)
+        elif current is not None:
+            for seat, name in enumerate(current.names):
+                if line.startswith(name + ' dealt '):
+                    current.hands[seat].extend(parse_cards(line))
+                    break
+            else:
+                event = parse_line(line, current.names)
+                if event is not None:
+                    current.events.append(event)
+    return rounds
+
+
+def load_history(filename):
+    '''
+    Reads a structured JSON history written by save_history, or else a game log.
+    '''
+    if not filename.endswith('.json'):
+        return parse_gamelog(filename)
+    with open(filename, 'r') as json_file:
+        records = json.load(json_file)
+    return [RecordedRound(record['round_num'], record['names'], record['bankrolls'], record['hands'],
+                          [tuple(event) for event in record['events']]) for record in records]
+
+
+def save_history(rounds, filename):
+    '''
+    Writes rounds as a structured JSON history.
+    '''
+    with open(filename, 'w') as json_file:
+        json.dump([recorded_round._asdict() for recorded_round in rounds], json_file)
+
+
+def player_stopped(recorded_round, seat):
+    '''
+    Returns True if the engine stopped querying the player during the round.
+    '''
+    return any(event[0] == 'error' and event[1] == seat and event[2] in FATAL_ERRORS
+               for event in recorded_round.events)
+
+
+def player_messages(recorded_round, seat, game_clock):
+    '''
+    Regenerates the messages the engine sent to one player during a round.
+
+    Arguments:
+    recorded_round: the RecordedRound.
+    seat: the player's index in the round.
+    game_clock: the game clock to report to the player.
+
+    Yields:
+    (message, street, code) tuples, where code is the action the player made in response,
+    or None if the player's response was an acknowledgement or was overridden by the engine.
+    Stops early if the engine stopped querying the player.
+    '''
+    clock = 'T{:.3f}'.format(game_clock)
+    messages = [['P0', 'H' + ','.join(recorded_round.hands[0])],
+                ['P1', 'H' + ','.join(recorded_round.hands[1])]]
+    street = 0
+    overridden = False
+    awards = 0
+    for event in recorded_round.events:
+        kind = event[0]
+        if kind == 'board':
+            street = event[1]
+            for message in messages:
+                message.append('B' + ','.join(event[2]))
+        elif kind == 'error' and event[1] == seat:
+            if event[2] in FATAL_ERRORS:
+                return
+            overridden = True
+        elif kind == 'action':
+            if event[1] == seat:
+                yield ' '.join([clock] + messages[seat]), street, None if overridden else event[2]
+                overridden = False
+            del messages[event[1]][:]  # do not send redundant action history
+            for message in messages:
+                message.append(event[2])
+        elif kind == 'show':
+            messages[1-event[1]].append('O' + ','.join(event[2]))
+        elif kind == 'award':
+            messages[event[1]].append('D' + str(event[2]))
+            awards += 1
+            if awards == 2:
+                yield ' '.join([clock] + messages[seat]), street, None
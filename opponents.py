@@ -0,0 +1,148 @@
+'''
+Trains the opponent action model of python_skeleton/skeleton/opponent.py from hand histories.
+
+Usage: python3 opponents.py PLAYER_NAME HISTORY [HISTORY ...]
+
+The recorded matches are fed to the skeleton's Runner from the seat facing the modelled player,
+so that decisions are recovered from the same round states a pokerbot sees in handle_round_over.
+'''
+from multiprocessing import Pool
+import argparse
+import os
+import sys
+import numpy as np
+
+from config import STARTING_GAME_CLOCK
+from histories import load_history, player_messages, player_stopped
+from replay import ReplayFile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_skeleton'))
+from skeleton.actions import CallAction, CheckAction
+from skeleton.bot import Bot
+from skeleton.runner import Runner
+from skeleton.opponent import (ACTION_CLASSES, NUM_FEATURES, LEARNING_RATE, REGULARIZATION, OpponentModel,
+                               decisions, features, legal_classes)
+
+NUM_EPOCHS = 20
+BATCH_SIZE = 256
+VALIDATION_SHARE = 0.1
+
+
+class Collector(Bot):
+    '''
+    Records the opponent's decisions at the end of each round.
+    '''
+
+    def __init__(self):
+        self.inputs = []
+        self.masks = []
+        self.labels = []
+
+    def handle_new_round(self, game_state, round_state, active):
+        pass
+
+    def handle_round_over(self, game_state, terminal_state, active):
+        for state, action_class in decisions(terminal_state, 1 - active):
+            self.inputs.append(features(state))
+            self.masks.append(legal_classes(state))
+            self.labels.append(action_class)
+
+    def get_action(self, game_state, round_state, active):
+        # the recorded history goes on whatever the response
+        return CheckAction() if CheckAction in round_state.legal_actions() else CallAction()
+
+
+def collect_match(filename, name):
+    '''
+    Returns the features, legal action class masks and action classes of a player's decisions in a match.
+    '''
+    messages = []
+    for recorded_round in load_history(filename):
+        if name not in recorded_round.names:
+            continue
+        seat = 1 - recorded_round.names.index(name)
+        messages.extend(message for message, _, _ in player_messages(recorded_round, seat, STARTING_GAME_CLOCK))
+        if player_stopped(recorded_round, seat):
+            break
+    collector = Collector()
+    Runner(collector, ReplayFile(messages)).run()
+    return (np.array(collector.inputs, dtype=float).reshape(-1, NUM_FEATURES),
+            np.array(collector.masks, dtype=bool).reshape(-1, len(ACTION_CLASSES)),
+            np.array(collector.labels, dtype=np.int64))
+
+
+def _collect_worker(task):
+    return collect_match(*task)
+
+
+def collect_matches(filenames, name, processes=None):
+    '''
+    Collects a player's decisions from recorded matches across a process pool.
+    '''
+    tasks = [(os.path.abspath(filename), name) for filename in filenames]
+    with Pool(processes) as pool:
+        matches = pool.map(_collect_worker, tasks)
+    return tuple(np.concatenate(arrays) for arrays in zip(*matches))
+
+
+def train(inputs, masks, labels, epochs=NUM_EPOCHS, batch_size=BATCH_SIZE, learning_rate=LEARNING_RATE,
+          regularization=REGULARIZATION, rng=None):
+    '''
+    Fits an OpponentModel with mini-batch gradient descent.
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    model = OpponentModel(learning_rate=learning_rate, regularization=regularization)
+    for _ in range(epochs):
+        order = rng.permutation(len(labels))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            model.gradient_step(inputs[batch], masks[batch], labels[batch])
+    return model
+
+
+def evaluate(model, inputs, masks, labels):
+    '''
+    Returns the model's mean cross-entropy and accuracy on a set of decisions.
+    '''
+    probabilities = model.probabilities(inputs, masks)
+    chosen = probabilities[np.arange(len(labels)), labels]
+    return -np.log(np.maximum(chosen, 1e-12)).mean(), (probabilities.argmax(axis=1) == labels).mean()
+
+
+def main():
+    '''
+    Trains a model of the player given on the command line and writes it to a file.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 opponents.py')
+    parser.add_argument('name', type=str, help='Name of the recorded player to model')
+    parser.add_argument('histories', type=str, nargs='+', help='Game logs or .json structured histories')
+    parser.add_argument('--output', type=str, default='opponent.npz', help='Model file, defaults to opponent.npz')
+    parser.add_argument('--epochs', type=int, default=NUM_EPOCHS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--learning-rate', type=float, default=LEARNING_RATE)
+    parser.add_argument('--regularization', type=float, default=REGULARIZATION)
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the CPU count')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    inputs, masks, labels = collect_matches(args.histories, args.name, args.processes)
+    if len(labels) == 0:
+        parser.error('no decisions by {} were found'.format(args.name))
+    counts = np.bincount(labels, minlength=len(ACTION_CLASSES))
+    print('{} decisions: {}'.format(len(labels), ', '.join(
+        '{} {}'.format(count, action_class) for action_class, count in zip(ACTION_CLASSES, counts))))
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(labels))
+    held_out = order[:int(len(order) * VALIDATION_SHARE)]
+    kept = order[len(held_out):]
+    model = train(inputs[kept], masks[kept], labels[kept], args.epochs, args.batch_size,
+                  args.learning_rate, args.regularization, rng)
+    for label, subset in (('training', kept), ('validation', held_out)):
+        if len(subset) > 0:
+            print('{}: {:.4f} cross-entropy, {:.1%} accuracy'.format(
+                label, *evaluate(model, inputs[subset], masks[subset], labels[subset])))
+    model.save(args.output)
+    print('Model written to', args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,6 +25,19 @@ class Player(Bot):
         '''
         pass
 
+    def handle_new_game(self):
+        '''
+        Called when the engine starts another game on the same connection.
+        Bankroll, game clock and round number start over; anything else you keep is up to you.
+
+        Arguments:
+        Nothing.
+
+        Returns:
+        Nothing.
+        '''
+        pass
+
     def handle_new_round(self, game_state, round_state, active):
         '''
         Called when a new round starts. Called NUM_ROUNDS times.
@@ -8,6 +8,19 @@ class Bot():
     The base class for a pokerbot.
     '''
 
+    def handle_new_game(self):
+        '''
+        Called when the engine starts another game on the same connection.
+        Bankroll, game clock and round number start over; anything else you keep is up to you.
+
+        Arguments:
+        Nothing.
+
+        Returns:
+        Nothing.
+        '''
+        pass
+
     def handle_new_round(self, game_state, round_state, active):
         '''
         Called when a new round starts. Called NUM_ROUNDS times.
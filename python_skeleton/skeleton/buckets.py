@@ -0,0 +1,151 @@
+'''
+Looks up hand buckets in the memory-mapped tables written by bucketing.py.
+'''
+from bisect import bisect_left, bisect_right
+import json
+import os
+import numpy as np
+import eval7
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+NUM_CARDS = 52
+NUM_HANDS = 1326
+RED_SUITS = (1, 2)
+# the ways of relabelling suits which keep each suit's colour, so that boards run out the same way:
+# none, clubs with spades, diamonds with hearts, and both
+SUIT_PERMUTATIONS = [(0, 1, 2, 3), (3, 1, 2, 0), (0, 2, 1, 3), (3, 2, 1, 0)]
+MAX_TABLE_STREET = 5
+# the river table has two rows per board, for a black and then a red river card
+RIVER_STREET = 5
+CARD_OBJECTS = {rank + suit: eval7.Card(rank + suit) for rank in RANKS for suit in SUITS}
+# BINOMIAL[n][k] is n choose k
+BINOMIAL = [[1] + [0] * MAX_TABLE_STREET for _ in range(NUM_CARDS + 1)]
+for _n in range(1, NUM_CARDS + 1):
+    for _k in range(1, MAX_TABLE_STREET + 1):
+        BINOMIAL[_n][_k] = BINOMIAL[_n-1][_k-1] + BINOMIAL[_n-1][_k]
+
+
+def river_row(row, river):
+    '''
+    Returns the river table row of a canonical board given the river card's index.
+    '''
+    return 2 * row + (river % 4 in RED_SUITS)
+
+
+def card_index(card):
+    '''
+    Returns the index from 0 to 51 of a card given as a string like 'Ah'.
+    '''
+    return 4 * RANKS.index(card[0]) + SUITS.index(card[1])
+
+
+def permute_card(index, permutation):
+    '''
+    Relabels the suit of a card index with one of SUIT_PERMUTATIONS.
+    '''
+    return index - index % 4 + SUIT_PERMUTATIONS[permutation][index % 4]
+
+
+def board_colex(indices):
+    '''
+    Returns the colexicographic rank of a board given as card indices in ascending order.
+    '''
+    return sum(BINOMIAL[index][i + 1] for i, index in enumerate(indices))
+
+
+def hand_index(first, second):
+    '''
+    Returns the lexicographic rank from 0 to 1325 of a hand given as card indices, first < second.
+    '''
+    return (NUM_CARDS - 1) * first - first * (first - 1) // 2 + second - first - 1
+
+
+class BucketTable():
+    '''
+    Hand buckets per street, read from a directory written by bucketing.py.
+
+    Each tabulated street has a board index, mapping the colexicographic rank of every board to its
+    canonical board times len(SUIT_PERMUTATIONS) plus the suit permutation taking it there, and a
+    table of buckets with a row per canonical board and a column per hand. On the river, whether
+    the board keeps running depends on the river card's colour, so each board has two rows.
+    Lookups read a single entry of each.
+
+    Longer boards, which are too many to tabulate, are bucketed by the share of the opponent's hands
+    beaten. The opponent's hands are evaluated once per board and kept until the board changes.
+    '''
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'buckets.json'), 'r') as metadata_file:
+            metadata = json.load(metadata_file)
+        if metadata.get('suit_permutations') != len(SUIT_PERMUTATIONS):
+            raise ValueError('the tables in {} are out of date, rebuild them with bucketing.py'.format(directory))
+        self.num_buckets = {int(street): num_buckets for street, num_buckets in metadata['num_buckets'].items()}
+        self.board_indices = {}
+        self.buckets = {}
+        for street in metadata['streets']:
+            self.board_indices[street] = np.load(os.path.join(directory, 'board-index-{}.npy'.format(street)),
+                                                 mmap_mode='r')
+            self.buckets[street] = np.load(os.path.join(directory, 'buckets-{}.npy'.format(street)), mmap_mode='r')
+        self.run_buckets = metadata['run_buckets']
+        self.run_board = None
+        self.run_scores = None  # sorted scores of every hand sharing no card with the run board
+        self.card_scores = None  # scores of those hands holding each card
+
+    def bucket(self, hand, board):
+        '''
+        Returns the bucket of a hand on a board.
+
+        Arguments:
+        hand: your two cards as strings like 'Ah'.
+        board: the board cards as strings, as many as the street.
+        '''
+        street = len(board)
+        if street not in self.buckets:
+            return self.strength_bucket(hand, board, self.run_buckets)
+        code = int(self.board_indices[street][board_colex(sorted(card_index(card) for card in board))])
+        row, permutation = divmod(code, len(SUIT_PERMUTATIONS))
+        if street == RIVER_STREET:
+            row = river_row(row, card_index(board[-1]))
+        first, second = sorted(permute_card(card_index(card), permutation) for card in hand)
+        return int(self.buckets[street][row, hand_index(first, second)])
+
+    def evaluate_board(self, board):
+        '''
+        Evaluates every hand on a board past the river, once per board.
+        '''
+        if self.run_board == board:
+            return
+        board_cards = [CARD_OBJECTS[card] for card in board]
+        remaining = [card for card in CARD_OBJECTS if card not in board]
+        scores = []
+        card_scores = {card: [] for card in remaining}
+        for i, first in enumerate(remaining):
+            for second in remaining[i+1:]:
+                score = eval7.evaluate(board_cards + [CARD_OBJECTS[first], CARD_OBJECTS[second]])
+                scores.append(score)
+                card_scores[first].append(score)
+                card_scores[second].append(score)
+        scores.sort()
+        self.run_board = list(board)
+        self.run_scores = scores
+        self.card_scores = card_scores
+
+    def strength_bucket(self, hand, board, num_buckets):
+        '''
+        Buckets a hand by the share of the opponent's hands it beats on the board as dealt so far.
+        '''
+        self.evaluate_board(board)
+        score = eval7.evaluate([CARD_OBJECTS[card] for card in board] + [CARD_OBJECTS[card] for card in hand])
+        # twice the hands beaten plus the hands tied
+        beaten = bisect_left(self.run_scores, score) + bisect_right(self.run_scores, score)
+        total = len(self.run_scores)
+        # take out the hands holding one of ours, counting the one holding both once
+        for card in hand:
+            for opponent_score in self.card_scores[card]:
+                beaten -= (opponent_score < score) + (opponent_score <= score)
+                total -= 1
+        # our own hand, which ties itself, was taken out for both cards
+        beaten += 1
+        total += 1
+        return min(beaten * num_buckets // (2 * total), num_buckets - 1)
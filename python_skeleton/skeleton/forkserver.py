@@ -0,0 +1,74 @@
+'''
+A fork server which starts each game from a copy of an already loaded pokerbot.
+'''
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+
+REQUEST_TIMEOUT = 1.  # seconds a client has to send the port, well within the engine's CONNECT_TIMEOUT
+
+
+def serve(pokerbot, args, run_bot):
+    '''
+    Listens on the Unix socket args.forkserver and forks a child per request to play one game.
+
+    The engine connects, sends the port to play on and reads the child's process id.
+    The connection then carries the child's output back to the engine.
+    '''
+    address = args.forkserver
+    if os.path.exists(address):
+        os.unlink(address)
+    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_socket.bind(address)
+    server_socket.listen()
+    # children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    # keep the loaded pokerbot out of garbage collection so that its pages stay shared with the children
+    gc.collect()
+    if hasattr(gc, 'freeze'):  # Python 3.7 and later
+        gc.freeze()
+    print('Fork server listening on', address)
+    sys.stdout.flush()
+    with server_socket:
+        while True:
+            connection, _ = server_socket.accept()
+            with connection:
+                # a client sending nothing must not hold up later requests
+                connection.settimeout(REQUEST_TIMEOUT)
+                try:
+                    port = int(connection.makefile('r').readline())
+                except (OSError, ValueError):
+                    continue
+                # the connection becomes the child's output, which must block
+                connection.settimeout(None)
+                if os.fork() == 0:
+                    server_socket.close()
+                    play(pokerbot, args, run_bot, connection, port)
+
+
+def play(pokerbot, args, run_bot, connection, port):
+    '''
+    Plays one game in a forked child, then exits.
+    '''
+    status = 0
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        connection.sendall('{}\n'.format(os.getpid()).encode())
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(connection.fileno(), 1)
+        os.dup2(connection.fileno(), 2)
+        game_args = argparse.Namespace(**vars(args))
+        game_args.forkserver = None
+        game_args.port = port
+        run_bot(pokerbot, game_args)
+    except BaseException:  # the child must never return to the server loop
+        status = 1
+        sys.excepthook(*sys.exc_info())
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
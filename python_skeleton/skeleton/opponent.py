@@ -0,0 +1,181 @@
+'''
+Predicts the opponent's next action from the public round state with a softmax regression model.
+'''
+import numpy as np
+from .actions import FoldAction, CallAction, CheckAction, RaiseAction
+from .states import STARTING_STACK
+
+ACTION_CLASSES = ('fold', 'check', 'call', 'small raise', 'medium raise', 'large raise', 'all-in')
+FOLD, CHECK, CALL, SMALL_RAISE, MEDIUM_RAISE, LARGE_RAISE, ALL_IN = range(len(ACTION_CLASSES))
+# raises adding less than these fractions of the pot after calling are small, then medium
+RAISE_FRACTIONS = (0.5, 1.)
+NUM_FEATURES = 14
+LEARNING_RATE = 0.05
+REGULARIZATION = 1e-4
+
+
+def features(round_state):
+    '''
+    Describes the decision facing the active player with public information only.
+    '''
+    active = round_state.button % 2
+    street = round_state.street
+    pips = round_state.pips
+    stacks = round_state.stacks
+    continue_cost = pips[1-active] - pips[active]
+    pot = 2 * STARTING_STACK - stacks[0] - stacks[1]
+    raises = 0
+    state = round_state
+    while state.previous_state is not None and state.previous_state.street == street:
+        raises += max(state.pips) > max(state.previous_state.pips)
+        state = state.previous_state
+    streets = [0.] * 5  # preflop, flop, turn, river, run
+    streets[0 if street == 0 else min(street - 2, 4)] = 1.
+    return [1.] + streets + [
+        float(active),
+        pot / (2 * STARTING_STACK),
+        continue_cost / pot,
+        float(continue_cost > 0),
+        min(stacks) / STARTING_STACK,
+        min(raises, 4) / 4,
+        float(round_state.button == (0 if street == 0 else 1)),  # first to act on the street
+        float(street > 5),
+    ]
+
+
+def raise_class(round_state, amount):
+    '''
+    Returns the action class of the active player raising to amount.
+    '''
+    active = round_state.button % 2
+    if amount >= round_state.raise_bounds()[1]:
+        return ALL_IN
+    pot_after_call = 2 * (STARTING_STACK - round_state.stacks[1-active])
+    fraction = (amount - round_state.pips[1-active]) / pot_after_call
+    if fraction < RAISE_FRACTIONS[0]:
+        return SMALL_RAISE
+    return MEDIUM_RAISE if fraction < RAISE_FRACTIONS[1] else LARGE_RAISE
+
+
+def legal_classes(round_state):
+    '''
+    Returns a mask of the action classes available to the active player.
+    '''
+    legal_actions = round_state.legal_actions()
+    mask = [FoldAction in legal_actions, CheckAction in legal_actions, CallAction in legal_actions,
+            False, False, False, False]
+    if RaiseAction in legal_actions:
+        for action_class in range(raise_class(round_state, round_state.raise_bounds()[0]), ALL_IN + 1):
+            mask[action_class] = True
+    return mask
+
+
+def decisions(terminal_state, player):
+    '''
+    Recovers a player's decisions in a finished round from the chain of round states.
+
+    Arguments:
+    terminal_state: the TerminalState passed to handle_round_over.
+    player: the index of the player whose decisions are returned.
+
+    Returns:
+    A list of (round_state, action_class) pairs in the order they were made, leaving out
+    decisions with a single action class available.
+    '''
+    states = []
+    state = terminal_state.previous_state
+    while state is not None:
+        states.append(state)
+        state = state.previous_state
+    states.reverse()
+    actions = []
+    after_call = False
+    for state, next_state in zip(states, states[1:]):
+        if after_call:  # the street ended with a call
+            after_call = False
+            continue
+        active = state.button % 2
+        if next_state.street != state.street or next_state.pips[active] == state.pips[active]:
+            actions.append((state, CHECK))
+        elif next_state.pips[active] == next_state.pips[1-active]:
+            actions.append((state, CALL))
+            # the small blind calling preflop does not end the street
+            after_call = state.street > 0 or state.button > 0
+        else:
+            actions.append((state, raise_class(state, next_state.pips[active])))
+    last_state = states[-1]
+    if not (last_state.hands[0] and last_state.hands[1]):  # no showdown
+        actions.append((last_state, FOLD))
+    elif not after_call:  # the last check ended the round
+        actions.append((last_state, CHECK))
+    return [(state, action_class) for state, action_class in actions
+            if state.button % 2 == player and sum(legal_classes(state)) > 1]
+
+
+class OpponentModel():
+    '''
+    A softmax regression over ACTION_CLASSES, restricted to the legal ones.
+    '''
+
+    def __init__(self, weights=None, learning_rate=LEARNING_RATE, regularization=REGULARIZATION):
+        self.weights = np.zeros((len(ACTION_CLASSES), NUM_FEATURES)) if weights is None else np.array(weights)
+        self.learning_rate = learning_rate
+        self.regularization = regularization
+
+    @classmethod
+    def load(cls, filename, **kwargs):
+        '''
+        Reads a model written by save.
+        '''
+        with np.load(filename) as model_file:
+            return cls(model_file['weights'], **kwargs)
+
+    def save(self, filename):
+        '''
+        Writes the model's weights to an .npz file.
+        '''
+        with open(filename, 'wb') as model_file:
+            np.savez(model_file, weights=self.weights)
+
+    def probabilities(self, inputs, masks):
+        '''
+        Returns the probabilities of the action classes, one decision per row.
+
+        Arguments:
+        inputs: an array of features with one decision per row.
+        masks: an array of legal_classes masks with one decision per row.
+        '''
+        scores = np.where(masks, inputs @ self.weights.T, -np.inf)
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def predict(self, round_state):
+        '''
+        Returns the probabilities of the active player's action classes, zero for the illegal ones.
+        '''
+        scores = np.where(legal_classes(round_state), self.weights @ features(round_state), -np.inf)
+        scores = np.exp(scores - scores.max())
+        return scores / scores.sum()
+
+    def gradient_step(self, inputs, masks, labels):
+        '''
+        Takes one gradient descent step on the cross-entropy of a batch of decisions.
+
+        Arguments:
+        inputs, masks: as for probabilities.
+        labels: the action class taken in each decision.
+        '''
+        errors = self.probabilities(inputs, masks)
+        errors[np.arange(len(labels)), labels] -= 1.
+        gradient = errors.T @ inputs / len(labels) + self.regularization * self.weights
+        self.weights -= self.learning_rate * gradient
+
+    def update(self, terminal_state, player):
+        '''
+        Learns from a player's decisions in a finished round. Call it from handle_round_over.
+        '''
+        observed = decisions(terminal_state, player)
+        if observed:
+            self.gradient_step(np.array([features(state) for state, _ in observed]),
+                               np.array([legal_classes(state) for state, _ in observed]),
+                               np.array([action_class for _, action_class in observed]))
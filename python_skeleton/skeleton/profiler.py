@@ -0,0 +1,151 @@
+'''
+Opt-in profiling of the pokerbot's callbacks, enabled with --profile.
+'''
+from collections import Counter
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+
+SAMPLE_INTERVAL = 0.001  # seconds between stack samples
+NUM_SLOWEST = 10  # decisions whose stack samples are kept
+STACK_DEPTH = 12  # innermost frames kept per stack sample
+NUM_STACKS = 5  # distinct stacks reported per slow decision
+
+
+class Profiler():
+    '''
+    Records wall and CPU time per callback and street, the game clock over the game,
+    and sampled stacks of the slowest decisions.
+    '''
+
+    def __init__(self, sample_interval=SAMPLE_INTERVAL, num_slowest=NUM_SLOWEST):
+        self.sample_interval = sample_interval
+        self.num_slowest = num_slowest
+        self.samples = None  # stack samples of the decision in progress
+        self.thread_id = threading.get_ident()
+        self.sampler = None
+        self.reset()
+
+    def reset(self):
+        '''
+        Discards everything recorded so far, to start the profile of a new game.
+        '''
+        self.callbacks = {}
+        self.streets = {}
+        self.clock = []
+        self.slowest = []  # min-heap of (wall, sequence number, decision record)
+        self.decisions = 0
+
+    def wrap(self, name, callback):
+        '''
+        Returns callback timed under the given name.
+        '''
+        def timed(game_state, state, active):
+            if name == 'handle_new_round':
+                self.clock.append([game_state.round_num, round(game_state.game_clock, 3)])
+            street = state.street if hasattr(state, 'street') else state.previous_state.street
+            samples = [] if name == 'get_action' else None
+            self.samples = samples
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            try:
+                return callback(game_state, state, active)
+            finally:
+                wall = time.perf_counter() - wall_start
+                cpu = time.thread_time() - cpu_start
+                self.samples = None
+                self.record(self.callbacks, name, wall, cpu)
+                if samples is not None:
+                    self.record(self.streets, street, wall, cpu)
+                    self.record_decision(game_state, street, wall, cpu, samples)
+        if self.sample_interval > 0 and name == 'get_action' and self.sampler is None:
+            self.sampler = threading.Thread(target=self.sample, daemon=True)
+            self.sampler.start()
+        return timed
+
+    @staticmethod
+    def record(table, key, wall, cpu):
+        '''
+        Adds one call to the totals kept under key.
+        '''
+        totals = table.get(key)
+        if totals is None:
+            totals = table[key] = [0, 0., 0., 0.]
+        totals[0] += 1
+        totals[1] += wall
+        totals[2] += cpu
+        totals[3] = max(totals[3], wall)
+
+    def record_decision(self, game_state, street, wall, cpu, samples):
+        '''
+        Keeps the decision's stack samples if it is among the slowest so far.
+        '''
+        self.decisions += 1
+        if len(self.slowest) == self.num_slowest and wall <= self.slowest[0][0]:
+            return
+        decision = {
+            'round': game_state.round_num,
+            'street': street,
+            'wall': round(wall, 6),
+            'cpu': round(cpu, 6),
+            'game_clock': round(game_state.game_clock, 3),
+            'stacks': [[count, list(stack)] for stack, count in Counter(samples).most_common(NUM_STACKS)],
+        }
+        entry = (wall, self.decisions, decision)
+        if len(self.slowest) < self.num_slowest:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heapreplace(self.slowest, entry)
+
+    def sample(self):
+        '''
+        Samples the main thread's stack while a decision is in progress.
+        '''
+        while True:
+            time.sleep(self.sample_interval)
+            samples = self.samples
+            if samples is None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < STACK_DEPTH:
+                code = frame.f_code
+                if code.co_filename == __file__:
+                    break
+                stack.append('{}:{} {}'.format(os.path.basename(code.co_filename), frame.f_lineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                samples.append(tuple(stack))
+
+    def report(self):
+        '''
+        Returns the profile as a JSON-serializable dict.
+        '''
+        def summarize(totals):
+            calls, wall, cpu, max_wall = totals
+            return {'calls': calls, 'wall': round(wall, 6), 'cpu': round(cpu, 6),
+                    'mean_wall': round(wall / calls, 6), 'max_wall': round(max_wall, 6)}
+        return {
+            'callbacks': {name: summarize(totals) for name, totals in self.callbacks.items()},
+            'streets': {str(street): summarize(totals) for street, totals in sorted(self.streets.items())},
+            'clock': self.clock,
+            'slowest': [decision for _, _, decision in sorted(self.slowest, reverse=True)],
+        }
+
+    def write(self):
+        '''
+        Prints a summary and the compact JSON profile of the game to the player log, then starts over.
+        Does nothing if no callback was made since the last profile.
+        '''
+        if not self.callbacks:
+            return
+        report = self.report()
+        for name, summary in report['callbacks'].items():
+            print('{}: {} calls, {:.3f}s wall, {:.3f}s cpu, {:.6f}s max'.format(
+                name, summary['calls'], summary['wall'], summary['cpu'], summary['max_wall']))
+        print('Profile', json.dumps(report, separators=(',', ':')))
+        sys.stdout.flush()
+        self.reset()
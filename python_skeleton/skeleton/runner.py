@@ -5,8 +5,10 @@ import argparse
 import socket
 from .actions import FoldAction, CallAction, CheckAction, RaiseAction
 from .states import GameState, TerminalState, RoundState
-from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND
+from .states import NUM_ROUNDS, STARTING_STACK, BIG_BLIND, SMALL_BLIND
 from .bot import Bot
+from .profiler import Profiler
+from .forkserver import serve
 
 
 class Runner():
@@ -14,9 +16,17 @@ class Runner():
     Interacts with the engine.
     '''
 
-    def __init__(self, pokerbot, socketfile):
+    def __init__(self, pokerbot, socketfile, profiler=None):
         self.pokerbot = pokerbot
         self.socketfile = socketfile
+        self.profiler = profiler
+        self.handle_new_round = pokerbot.handle_new_round
+        self.handle_round_over = pokerbot.handle_round_over
+        self.get_action = pokerbot.get_action
+        if profiler is not None:
+            self.handle_new_round = profiler.wrap('handle_new_round', self.handle_new_round)
+            self.handle_round_over = profiler.wrap('handle_round_over', self.handle_round_over)
+            self.get_action = profiler.wrap('get_action', self.get_action)
 
     def receive(self):
         '''
@@ -52,6 +62,7 @@ class Runner():
         active = 0
         round_flag = True
         for packet in self.receive():
+            new_game = False
             for clause in packet:
                 if clause[0] == 'T':
                     game_state = GameState(game_state.bankroll, float(clause[1:]), game_state.round_num)
@@ -64,7 +75,7 @@ class Runner():
                     stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
                     round_state = RoundState(0, 0, pips, stacks, hands, [], None)
                     if round_flag:
-                        self.pokerbot.handle_new_round(game_state, round_state, active)
+                        self.handle_new_round(game_state, round_state, active)
                         round_flag = False
                 elif clause[0] == 'F':
                     round_state = round_state.proceed(FoldAction())
@@ -93,16 +104,28 @@ class Runner():
                     deltas[active] = delta
                     round_state = TerminalState(deltas, round_state.previous_state)
                     game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
-                    self.pokerbot.handle_round_over(game_state, round_state, active)
+                    self.handle_round_over(game_state, round_state, active)
+                    if self.profiler is not None and game_state.round_num == NUM_ROUNDS:
+                        # report before acking, so that the profile lands in this game's player log
+                        self.profiler.write()
                     game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
                     round_flag = True
+                elif clause[0] == 'G':
+                    game_state = GameState(0, 0., 1)
+                    round_state = None
+                    round_flag = True
+                    new_game = True
+                    self.pokerbot.handle_new_game()
                 elif clause[0] == 'Q':
                     return
-            if round_flag:  # ack the engine
+            if new_game:  # ack the new game
+                self.socketfile.write('G\n')
+                self.socketfile.flush()
+            elif round_flag:  # ack the engine
                 self.send(CheckAction())
             else:
                 assert active == round_state.button % 2
-                action = self.pokerbot.get_action(game_state, round_state, active)
+                action = self.get_action(game_state, round_state, active)
                 self.send(action)
 
 
@@ -112,21 +135,34 @@ def parse_args():
     '''
     parser = argparse.ArgumentParser(prog='python3 player.py')
     parser.add_argument('--host', type=str, default='localhost', help='Host to connect to, defaults to localhost')
-    parser.add_argument('port', type=int, help='Port on host to connect to')
-    return parser.parse_args()
+    parser.add_argument('--profile', action='store_true', help='Profile the pokerbot\'s callbacks')
+    parser.add_argument('--forkserver', type=str, default=None, help='Unix socket to serve forked copies of the pokerbot on')
+    parser.add_argument('port', type=int, nargs='?', help='Port on host to connect to')
+    args = parser.parse_args()
+    if args.port is None and args.forkserver is None:
+        parser.error('the port is required unless running a fork server')
+    return args
 
 def run_bot(pokerbot, args):
     '''
     Runs the pokerbot.
     '''
     assert isinstance(pokerbot, Bot)
+    if args.forkserver is not None:
+        serve(pokerbot, args, run_bot)
+        return
     try:
         sock = socket.create_connection((args.host, args.port))
     except OSError:
         print('Could not connect to {}:{}'.format(args.host, args.port))
         return
     socketfile = sock.makefile('rw')
-    runner = Runner(pokerbot, socketfile)
-    runner.run()
+    profiler = Profiler() if args.profile else None
+    runner = Runner(pokerbot, socketfile, profiler)
+    try:
+        runner.run()
+    finally:
+        if profiler is not None:  # the game was cut short
+            profiler.write()
     socketfile.close()
     sock.close()
@@ -0,0 +1,160 @@
+'''
+Replays recorded matches against a Python pokerbot in-process and reports where its decisions differ.
+
+Usage: python3 replay.py BOT_PATH PLAYER_NAME HISTORY [HISTORY ...]
+'''
+from collections import namedtuple
+from multiprocessing import Pool
+import argparse
+import importlib
+import os
+import sys
+
+from config import STARTING_GAME_CLOCK
+from histories import load_history, player_messages, player_stopped
+
+Divergence = namedtuple('Divergence', ['filename', 'round_num', 'street', 'recorded', 'replayed'])
+ReplayResult = namedtuple('ReplayResult', ['filename', 'rounds', 'decisions', 'divergences', 'error'])
+
+
+class ReplayFile():
+    '''
+    Stands in for the socket file, serving recorded messages and collecting the bot's responses.
+    '''
+
+    def __init__(self, messages):
+        self.messages = iter(messages)
+        self.responses = []
+
+    def readline(self):
+        '''
+        Returns the next recorded message, then a game over message.
+        '''
+        return next(self.messages, 'Q') + '\n'
+
+    def write(self, data):
+        '''
+        Collects a response from the bot.
+        '''
+        self.responses.append(data.strip())
+
+    def flush(self):
+        '''
+        Nothing is buffered.
+        '''
+
+
+def load_bot(bot_path, module_name, class_name):
+    '''
+    Imports a pokerbot and the skeleton it was written against.
+    Returns the pokerbot class and the skeleton's Runner class.
+    '''
+    bot_path = os.path.abspath(bot_path)
+    os.chdir(bot_path)
+    sys.path.insert(0, bot_path)
+    module = importlib.import_module(module_name)
+    runner = importlib.import_module('skeleton.runner')
+    return getattr(module, class_name), runner.Runner
+
+
+def replay_match(bot_class, runner_class, filename, name, game_clock):
+    '''
+    Replays one recorded match against a fresh pokerbot.
+    '''
+    rounds = load_history(filename)
+    messages = []
+    expected = []
+    played = 0
+    for recorded_round in rounds:
+        if name not in recorded_round.names:
+            continue
+        seat = recorded_round.names.index(name)
+        for message, street, code in player_messages(recorded_round, seat, game_clock):
+            messages.append(message)
+            expected.append((recorded_round.round_num, street, code))
+        played += 1
+        if player_stopped(recorded_round, seat):
+            break
+    socketfile = ReplayFile(messages)
+    error = None
+    try:
+        runner_class(bot_class(), socketfile).run()
+    except Exception as exception:  # report broken bots instead of killing the pool
+        error = '{}: {}'.format(type(exception).__name__, exception)
+    divergences = []
+    decisions = 0
+    for (round_num, street, recorded), replayed in zip(expected, socketfile.responses):
+        if recorded is None:
+            continue
+        decisions += 1
+        if replayed != recorded:
+            divergences.append(Divergence(filename, round_num, street, recorded, replayed))
+    return ReplayResult(filename, played, decisions, divergences, error)
+
+
+# each worker process imports the pokerbot once and replays whole matches with fresh instances
+_worker = {}
+
+
+def _init_worker(bot_path, module_name, class_name, name, game_clock):
+    _worker['classes'] = load_bot(bot_path, module_name, class_name)
+    _worker['name'] = name
+    _worker['game_clock'] = game_clock
+
+
+def _replay_worker(filename):
+    bot_class, runner_class = _worker['classes']
+    return replay_match(bot_class, runner_class, filename, _worker['name'], _worker['game_clock'])
+
+
+def replay_matches(filenames, bot_path, name, module_name='player', class_name='Player',
+                   game_clock=STARTING_GAME_CLOCK, processes=None):
+    '''
+    Replays recorded matches across a process pool, yielding a ReplayResult per match as it finishes.
+
+    Arguments:
+    filenames: game logs or structured histories.
+    bot_path: the directory holding the pokerbot.
+    name: the name of the player whose decisions are replayed.
+    module_name, class_name: where the pokerbot class is defined.
+    game_clock: the game clock reported to the pokerbot.
+    processes: the number of worker processes, defaults to the number of CPUs.
+    '''
+    filenames = [os.path.abspath(filename) for filename in filenames]
+    initargs = (bot_path, module_name, class_name, name, game_clock)
+    with Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        for result in pool.imap_unordered(_replay_worker, filenames):
+            yield result
+
+
+def main():
+    '''
+    Replays the matches given on the command line and prints the differing decisions.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 replay.py')
+    parser.add_argument('bot_path', type=str, help='Directory of the pokerbot to replay')
+    parser.add_argument('name', type=str, help='Name of the recorded player whose decisions are replayed')
+    parser.add_argument('histories', type=str, nargs='+', help='Game logs or .json structured histories')
+    parser.add_argument('--module', type=str, default='player', help='Module defining the pokerbot, defaults to player')
+    parser.add_argument('--bot-class', type=str, default='Player', help='Pokerbot class, defaults to Player')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes, defaults to the CPU count')
+    parser.add_argument('--limit', type=int, default=20, help='Differences to print per match, defaults to 20')
+    args = parser.parse_args()
+    total_decisions = 0
+    total_divergences = 0
+    for result in replay_matches(args.histories, args.bot_path, args.name, args.module, args.bot_class,
+                                 processes=args.processes):
+        total_decisions += result.decisions
+        total_divergences += len(result.divergences)
+        print('{}: {} rounds, {} decisions, {} differ'.format(result.filename, result.rounds,
+                                                              result.decisions, len(result.divergences)))
+        if result.error is not None:
+            print('  replay stopped by', result.error)
+        for divergence in result.divergences[:args.limit]:
+            print('  round {} street {}: recorded {}, replayed {}'.format(
+                divergence.round_num, divergence.street, divergence.recorded, divergence.replayed))
+    print('Total: {} decisions, {} differ'.format(total_decisions, total_divergences))
+
+
+if __name__ == '__main__':
+    main()